@@ -1,21 +1,23 @@
+import heapq
+from itertools import count
 from search_algorithm import SearchAlgorithm
-from queue import PriorityQueue
-from search_algorithm import Node
+from search_algorithm import SearchMemory
 import heuristics as h
 
 
-class AstarNode(Node):
-    def __init__(self, state, parent=None, action=None, g=0, h=0) -> None:
-        self.h = h
-        super().__init__(state, parent, action, g)
-
-    def __lt__(self, other):
-        return self.g + self.h < other.g + other.h
-
-
 class AStar(SearchAlgorithm):
     """AStar First Search
 
+    Nodes are ordered by g + w * h on a binary heap. Instead of a
+    decrease-key, a cheaper path to a state pushes a new entry and the old
+    one is skipped when popped (lazy deletion against the best g found so
+    far). With w = 1 and an admissible heuristic the plan is optimal; w > 1
+    gives weighted A*.
+
+    States are flat cell indices: g, parents and actions are kept in a
+    SearchMemory and the successors come from the world NeighbourTable,
+    so no object is allocated per state.
+
     Args:
         Solver (_type_): This is an implementation for the Solver class
     """
@@ -25,29 +27,51 @@ class AStar(SearchAlgorithm):
         self.w = w
         super().__init__(view)
 
-    def solve(self, problem, draw, grid, he, truck) -> list:
-        print(he)
-        frontier = PriorityQueue()
-        reached = set()
-        node = AstarNode(problem.init, None, None, 0,
-                         h.choose_heuristic(he, problem.init, problem.goal))
-        frontier.put(node)
-        reached.add(node.state)
-        while not frontier.empty():
-            node = frontier.get()
-            states = problem.getSuccessors(node.state, truck)
-            for state in states:
-                child_node = AstarNode(
-                    state[1], node, state[0], 0, h.choose_heuristic(he, state[1], problem.goal))
-                if child_node.state not in reached:
-                    self.update_expanded(child_node.state)
-                    grid[state[1][0]][state[1][1]].make_open()
-                    reached.add(child_node.state)
-                    if problem.isGoal(child_node.state):
-                        print("goal node: ", child_node.state)
-                        return self.extract_solution(child_node)
-                    else:
-                        frontier.put(child_node)
-            if node.parent is not None:
-                grid[node.state[0]][node.state[1]].make_closed()
-            draw()
+    def solve(self, problem, truck, he="m", observer=None) -> list:
+        w = self.w
+        world = problem.world
+        cost = dict(problem.cost)
+        costs = [cost[a] for a in problem.actions]
+        stats = self.start_stats()
+        heuristic_table, push, pop = h.heuristic_table, heapq.heappush, heapq.heappop
+        if stats is not None:
+            heuristic_table = stats.timed(heuristic_table, "heuristic_time")
+            push, pop = stats.timed(push, "queue_time"), stats.timed(pop, "queue_time")
+        h_table = heuristic_table(he, problem, vehicle_type=truck.type)
+        neighbours = problem.neighbours(truck).neighbours
+        if stats is not None:
+            neighbours = stats.successors(neighbours)
+            h_table = stats.counted(h_table)
+        memory = SearchMemory(world.cells.size, problem.actions)
+        best_g, parent, action = memory.g, memory.parent, memory.action
+        state = world.state
+        start, goal = world.index(problem.init), world.index(problem.goal)
+        tie = count()
+        best_g[start] = 0
+        frontier = [(w * h_table[start], h_table[start], next(tie), 0, start)]
+        while frontier:
+            _, _, _, g_i, i = pop(frontier)
+            if g_i > best_g[i]:
+                continue
+            if i == goal:
+                return memory.plan(i)
+            self.update_expanded(state(i))
+            indices, codes = neighbours(i)
+            for j, code in zip(indices, codes):
+                g = g_i + costs[code]
+                if g < best_g[j]:
+                    best_g[j] = g
+                    parent[j] = i
+                    action[j] = code
+                    child_h = h_table[j]
+                    push(frontier, (g + w * child_h, child_h, next(tie), g, j))
+                    if observer is not None:
+                        observer.open(state(j))
+                elif stats is not None:
+                    stats.duplicates += 1
+            self.update_frontier(len(frontier))
+            if observer is not None:
+                if i != start:
+                    observer.closed(state(i))
+                observer.step()
+        return None
@@ -0,0 +1,171 @@
+import heapq
+import math
+from itertools import count
+from search_algorithm import SearchAlgorithm
+import heuristics as h
+
+
+def stitch(forward, backward, meet):
+    """Plan through meet from the forward and backward parent maps.
+
+    forward maps a state to (parent, action) towards init, backward maps a
+    state to (child, action) towards the goal; init and goal map to None.
+    """
+    plan = []
+    state = meet
+    while forward[state] is not None:
+        state, action = forward[state]
+        plan.append(action)
+    plan.reverse()
+    state = meet
+    while backward[state] is not None:
+        state, action = backward[state]
+        plan.append(action)
+    return plan
+
+
+class BiBrFS(SearchAlgorithm):
+    """Bidirectional Breath First Search
+
+    Expands a whole layer at a time, from init forward or from the goal
+    backward (PathFinding.getPredecessors), always on the smaller side. When
+    a layer touches the other side the layer is finished and the shortest
+    connection is kept.
+    """
+
+    uses_heuristic = False
+
+    def solve(self, problem, truck, he=None, observer=None) -> list:
+        stats = self.start_stats()
+        if problem.isGoal(problem.init):
+            return []
+        forward = {problem.init: None}
+        backward = {problem.goal: None}
+        forward_layer = [problem.init]
+        backward_layer = [problem.goal]
+        depth = {problem.init: 0}, {problem.goal: 0}
+        successors = lambda s: problem.getSuccessors(s, truck)
+        predecessors = lambda s: problem.getPredecessors(s, truck)
+        if stats is not None:
+            successors, predecessors = stats.successors(successors), stats.successors(predecessors)
+        while forward_layer and backward_layer:
+            if len(forward_layer) <= len(backward_layer):
+                forward_layer, meet = self._layer(
+                    forward_layer, forward, backward, depth[0], depth[1],
+                    successors, True, observer)
+            else:
+                backward_layer, meet = self._layer(
+                    backward_layer, backward, forward, depth[1], depth[0],
+                    predecessors, False, observer)
+            if meet is not None:
+                return stitch(forward, backward, meet)
+        return None
+
+    def _layer(self, layer, parents, other, depth, other_depth, expand, forward, observer):
+        next_layer = []
+        push = next_layer.append
+        stats = self.stats
+        if stats is not None:
+            push = stats.timed(push, "queue_time")
+        meet = None
+        best = math.inf
+        for state in layer:
+            self.update_expanded(state)
+            for action, succ in expand(state):
+                if succ in parents:
+                    if stats is not None:
+                        stats.duplicates += 1
+                    continue
+                parents[succ] = (state, action)
+                depth[succ] = depth[state] + 1
+                push(succ)
+                if observer is not None:
+                    observer.open(succ)
+                if succ in other and depth[succ] + other_depth[succ] < best:
+                    best = depth[succ] + other_depth[succ]
+                    meet = succ
+            if observer is not None:
+                observer.closed(state)
+                observer.step()
+        self.update_frontier(len(next_layer))
+        return next_layer, meet
+
+
+class BiAStar(SearchAlgorithm):
+    """Bidirectional A* (front-to-end)
+
+    A forward A* from init towards the goal and a backward A* from the goal
+    towards init (PathFinding.getPredecessors), each with the heuristic to
+    its own target, expanding on the side with the smaller open list. Every
+    time a side reaches a state the other side already has, the connection
+    updates mu, the best plan cost so far. With an admissible heuristic the
+    top of either open list is a lower bound on any plan not yet found, so
+    the search stops as soon as one of them reaches mu.
+    """
+
+    def __init__(self, view=False, w=1) -> None:
+        self.w = w
+        super().__init__(view)
+
+    def solve(self, problem, truck, he="m", observer=None) -> list:
+        stats = self.start_stats()
+        if problem.isGoal(problem.init):
+            return []
+        index = problem.world.index
+        cost = dict(problem.cost)
+        w = self.w
+        tie = count()
+        heuristic_table, push, pop = h.heuristic_table, heapq.heappush, heapq.heappop
+        successors = lambda s: problem.getSuccessors(s, truck)
+        predecessors = lambda s: problem.getPredecessors(s, truck)
+        if stats is not None:
+            heuristic_table = stats.timed(heuristic_table, "heuristic_time")
+            push, pop = stats.timed(push, "queue_time"), stats.timed(pop, "queue_time")
+            successors, predecessors = stats.successors(successors), stats.successors(predecessors)
+        to_goal = heuristic_table(he, problem, vehicle_type=truck.type)
+        to_init = heuristic_table(he, problem, problem.init, truck.type)
+        if stats is not None:
+            to_goal, to_init = stats.counted(to_goal), stats.counted(to_init)
+        sides = [
+            # open list, g, parents, heuristic table, expansion
+            ([(w * to_goal[index(problem.init)], next(tie), 0, problem.init)],
+             {problem.init: 0}, {problem.init: None}, to_goal, successors),
+            ([(w * to_init[index(problem.goal)], next(tie), 0, problem.goal)],
+             {problem.goal: 0}, {problem.goal: None}, to_init, predecessors),
+        ]
+        mu = math.inf
+        meet = None
+        while True:
+            for frontier, g, _, _, _ in sides:
+                while frontier and frontier[0][2] > g[frontier[0][3]]:
+                    pop(frontier)
+            if not sides[0][0] or not sides[1][0]:
+                break
+            if sides[0][0][0][0] >= mu or sides[1][0][0][0] >= mu:
+                break
+            side = 0 if len(sides[0][0]) <= len(sides[1][0]) else 1
+            frontier, g, parents, h_table, expand = sides[side]
+            other_g = sides[1 - side][1]
+            _, _, state_g, state = pop(frontier)
+            self.update_expanded(state)
+            for action, succ in expand(state):
+                succ_g = state_g + cost[action]
+                if succ_g < g.get(succ, math.inf):
+                    g[succ] = succ_g
+                    parents[succ] = (state, action)
+                    push(frontier, (succ_g + w * h_table[index(succ)],
+                                    next(tie), succ_g, succ))
+                    if observer is not None:
+                        observer.open(succ)
+                    if succ in other_g and succ_g + other_g[succ] < mu:
+                        mu = succ_g + other_g[succ]
+                        meet = succ
+                elif stats is not None:
+                    stats.duplicates += 1
+            self.update_frontier(len(sides[0][0]) + len(sides[1][0]))
+            if observer is not None:
+                observer.closed(state)
+                observer.step()
+        if meet is None:
+            return None
+        return stitch(sides[0][2], sides[1][2], meet)
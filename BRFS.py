@@ -1,35 +1,141 @@
+from collections import deque
+import numpy as np
 from search_algorithm import SearchAlgorithm
-from queue import Queue
-from search_algorithm import Node
+from search_algorithm import SearchMemory
+
+
+def distance_map(world, source, vehicle_type, target=None, observer=None):
+    """Breadth-first distances from source over the World occupancy grid.
+
+    The whole frontier is expanded at once: the next level is the frontier
+    dilated by one cell in the eight directions (two array shifts per axis),
+    restricted to unvisited cells the vehicle can enter. Returns an int32
+    array shaped like world.cells with -1 on unreachable cells. If target
+    is given the search stops as soon as it is reached.
+    """
+    cells = world.cells
+    passable = (cells & world.blocked(vehicle_type)) == 0
+    dist = np.full(cells.shape, -1, dtype=np.int32)
+    frontier = np.zeros(cells.shape, dtype=bool)
+    source = (source[0] + 1, source[1] + 1)
+    frontier[source] = True
+    dist[source] = 0
+    unvisited = passable.copy()
+    unvisited[source] = False
+    if target is not None:
+        target = (target[0] + 1, target[1] + 1)
+    grown = np.empty_like(frontier)
+    level = 0
+    while frontier.any() and (target is None or dist[target] < 0):
+        level += 1
+        grown[...] = frontier
+        grown[1:, :] |= frontier[:-1, :]
+        grown[:-1, :] |= frontier[1:, :]
+        frontier = grown.copy()
+        frontier[:, 1:] |= grown[:, :-1]
+        frontier[:, :-1] |= grown[:, 1:]
+        frontier &= unvisited
+        unvisited &= ~frontier
+        dist[frontier] = level
+        if observer is not None:
+            for x, y in np.argwhere(frontier):
+                observer.open((x - 1, y - 1))
+            observer.step()
+    return dist
+
+
+def descend(dist, goal, actions, moves):
+    """Plan to goal following a distance_map back to its source.
+
+    At every step the first action (in the order of actions) coming from a
+    cell one level closer to the source is taken.
+    """
+    x, y = goal[0] + 1, goal[1] + 1
+    level = dist[x, y]
+    if level < 0:
+        return None
+    plan = []
+    while level > 0:
+        for a in actions:
+            dx, dy = moves[a]
+            if dist[x - dx, y - dy] == level - 1:
+                plan.append(a)
+                x, y = x - dx, y - dy
+                break
+        level -= 1
+    plan.reverse()
+    return plan
 
 
 class BrFS(SearchAlgorithm):
     """Breath First Search
 
+    The frontier is a deque of flat cell indices, visited states are marked
+    in a bytearray indexed like the World occupancy grid and parents are
+    kept in a SearchMemory, so every node costs O(1) and no object. With
+    wavefront=True the search is level-synchronous on the whole grid (see
+    distance_map) and the plan is read back from the distance map.
+
     Args:
         Solver (_type_): This is an implementation for the Solver class
     """
 
-    def solve(self, problem, draw, grid, truck) -> list:
-        node = Node(problem.init, None, None, 0)
-        reached = set()
-        reached.add(node.state)
-        frontier = Queue()
-        frontier.put(node)
-        while not frontier.empty():
-            node = frontier.get()
-            states = problem.getSuccessors(node.state, truck)
-            for state in states:
-                child_node = Node(state[1], node, state[0], 0)
-                if child_node.state not in reached and child_node not in list(frontier.queue):
-                    reached.add(child_node.state)
-                    self.update_expanded(child_node.state)
-                    grid[state[1][0]][state[1][1]].make_open()
-                    if problem.isGoal(child_node.state):
-                        print("goal node: ", child_node.state)
-                        return self.extract_solution(child_node)
-                    else:
-                        frontier.put(child_node)
-            if node.parent is not None:
-                grid[node.state[0]][node.state[1]].make_closed()
-            draw()
+    uses_heuristic = False
+
+    def __init__(self, view=False, wavefront=False) -> None:
+        self.wavefront = wavefront
+        super().__init__(view)
+
+    def solve(self, problem, truck, he=None, observer=None) -> list:
+        if self.wavefront:
+            return self.solve_wavefront(problem, truck, observer)
+        world = problem.world
+        start, goal = world.index(problem.init), world.index(problem.goal)
+        if start == goal:
+            return []
+        neighbours = problem.neighbours(truck).neighbours
+        memory = SearchMemory(world.cells.size, problem.actions)
+        parent, action = memory.parent, memory.action
+        state = world.state
+        reached = bytearray(world.cells.size)
+        reached[start] = 1
+        frontier = deque([start])
+        pop, push = frontier.popleft, frontier.append
+        stats = self.start_stats()
+        if stats is not None:
+            neighbours = stats.successors(neighbours)
+            pop, push = stats.timed(pop, "queue_time"), stats.timed(push, "queue_time")
+        while frontier:
+            i = pop()
+            indices, codes = neighbours(i)
+            for j, code in zip(indices, codes):
+                if not reached[j]:
+                    reached[j] = 1
+                    parent[j] = i
+                    action[j] = code
+                    self.update_expanded(state(j))
+                    if observer is not None:
+                        observer.open(state(j))
+                    if j == goal:
+                        return memory.plan(j)
+                    push(j)
+                elif stats is not None:
+                    stats.duplicates += 1
+            self.update_frontier(len(frontier))
+            if observer is not None:
+                if i != start:
+                    observer.closed(state(i))
+                observer.step()
+        return None
+
+    def solve_wavefront(self, problem, truck, observer=None) -> list:
+        from path_finding import MOVES
+        stats = self.start_stats()
+        dist = distance_map(problem.world, problem.init, truck.type,
+                            problem.goal, observer)
+        self.expanded = int(np.count_nonzero(dist >= 0))
+        if stats is not None:
+            # The wavefront works on whole arrays, not on single successors
+            stats.unmeasured("generated", "duplicates", "successor_time", "queue_time")
+            stats.expanded = self.expanded
+        return descend(dist, problem.goal, problem.actions, MOVES)
@@ -0,0 +1,205 @@
+import heapq
+import math
+from search_algorithm import SearchAlgorithm
+import heuristics as h
+
+
+class DStarLite(SearchAlgorithm):
+    """D* Lite: A* that repairs its last search instead of starting over.
+
+    The search runs backwards from the goal, keeping for every cell g (the
+    distance to the goal found so far) and rhs (the one-step lookahead
+    min over successors of cost + g). The solver subscribes to the World,
+    so every wall or ZTL edit is queued and, on the next solve, only the
+    cells around the edited ones are updated and the inconsistent part of
+    the search is repaired.
+
+    The start may change between calls, as the truck advances along the
+    plan: the queue keys stay valid by adding to km the heuristic distance
+    between the old and the new start. A different World, goal, vehicle
+    type or heuristic starts a new search. The heuristic must be
+    admissible: with 'm' or 'e', which overestimate diagonal moves, the
+    repaired g values need not lead down to the goal, so those are
+    replaced by 'o'. The plans are then optimal, as with A*.
+
+    expanded counts the expansions of the last call only, so it measures
+    the cost of a replan.
+    """
+
+    def __init__(self, view=False) -> None:
+        self.world = None
+        self.changed = set()
+        super().__init__(view)
+
+    def _on_edit(self, state):
+        self.changed.add(self.world.index(state))
+
+    def _start(self, problem, truck, he):
+        if self.world is not None:
+            self.world.unsubscribe(self._on_edit)
+        world = self.world = problem.world
+        world.subscribe(self._on_edit)
+        self.changed = set()
+        self.context = (truck.type, he, tuple(problem.goal))
+        self.blocked = world.blocked(truck.type)
+        cost = dict(problem.cost)
+        self.moves = [(a, offset, cost[a]) for a, _, _, offset in problem.moves]
+        self.goal = world.index(problem.goal)
+        self.last = world.index(problem.init)
+        self.h_table = h.heuristic_table(he, problem, goal=problem.init,
+                                         vehicle_type=truck.type)
+        self.km = 0
+        self.g = {}
+        self.rhs = {self.goal: 0}
+        self.open_key = {}
+        self.queue = []
+        self._push(self.goal)
+
+    def _key(self, i):
+        m = min(self.g.get(i, math.inf), self.rhs.get(i, math.inf))
+        return (m + self.h_table[i] + self.km, m)
+
+    def _push(self, i):
+        key = self.open_key[i] = self._key(i)
+        heapq.heappush(self.queue, (key, i))
+
+    def _passable(self, i):
+        return not self.world.flat[i] & self.blocked
+
+    def _lookahead(self, i):
+        """rhs of i: the best cost + g over its successors"""
+        flat, blocked, g = self.world.flat, self.blocked, self.g
+        best = math.inf
+        for _, offset, c in self.moves:
+            j = i + offset
+            if not flat[j] & blocked:
+                best = min(best, c + g.get(j, math.inf))
+        return best
+
+    def _update(self, i, observer):
+        if i != self.goal:
+            if self._passable(i) or i == self.start:
+                self.rhs[i] = self._lookahead(i)
+            elif i not in self.g and i not in self.rhs:
+                return
+            else:
+                # A cell that became a wall: nothing enters it any more
+                self.rhs[i] = math.inf
+        self.open_key.pop(i, None)
+        if self.g.get(i, math.inf) != self.rhs.get(i, math.inf):
+            self._push(i)
+            if observer is not None:
+                observer.open(self.world.state(i))
+
+    def _predecessors(self, i):
+        # Any neighbour the truck can be in leads to i, as long as i itself
+        # can be entered (see PathFinding.moves)
+        if not self._passable(i):
+            return []
+        flat, blocked, start = self.world.flat, self.blocked, self.start
+        return [(i - offset, c) for _, offset, c in self.moves
+                if not flat[i - offset] & blocked or i - offset == start]
+
+    def _compute(self, observer):
+        queue, open_key, g, rhs = self.queue, self.open_key, self.g, self.rhs
+        start = self.start
+        while queue:
+            key, i = queue[0]
+            if open_key.get(i) != key:
+                heapq.heappop(queue)
+                continue
+            g_start = g.get(start, math.inf)
+            if key >= self._key(start) and rhs.get(start, math.inf) == g_start:
+                break
+            new_key = self._key(i)
+            if key < new_key:
+                heapq.heapreplace(queue, (new_key, i))
+                open_key[i] = new_key
+                continue
+            heapq.heappop(queue)
+            del open_key[i]
+            self.update_expanded(self.world.state(i))
+            g_i = g.get(i, math.inf)
+            if g_i > rhs[i]:
+                g[i] = rhs[i]
+                for j, c in self._predecessors(i):
+                    if j != self.goal and c + g[i] < rhs.get(j, math.inf):
+                        rhs[j] = c + g[i]
+                        self.open_key.pop(j, None)
+                        if g.get(j, math.inf) != rhs[j]:
+                            self._push(j)
+                            if observer is not None:
+                                observer.open(self.world.state(j))
+            else:
+                g[i] = math.inf
+                for j, c in self._predecessors(i) + [(i, 0)]:
+                    if j == i or rhs.get(j, math.inf) == c + g_i:
+                        self._update(j, observer)
+            self.update_frontier(len(open_key))
+            if observer is not None:
+                observer.closed(self.world.state(i))
+                observer.step()
+
+    def _plan(self):
+        """Descend g from the start to the goal, None if it does not get there.
+
+        Every step goes to a cell with a lower g, so the walk cannot loop
+        even if g is not consistent.
+        """
+        g, flat, blocked = self.g, self.world.flat, self.blocked
+        i = self.start
+        if g.get(i, math.inf) == math.inf:
+            return None
+        plan = []
+        while i != self.goal:
+            g_i = g[i]
+            best = None
+            for a, offset, c in self.moves:
+                j = i + offset
+                if not flat[j] & blocked and g.get(j, math.inf) < g_i:
+                    value = c + g[j]
+                    if best is None or value < best[0]:
+                        best = (value, a, j)
+            if best is None:
+                return None
+            plan.append(best[1])
+            i = best[2]
+        return plan
+
+    def solve(self, problem, truck, he="m", observer=None) -> list:
+        self.reset_expanded()
+        stats = self.start_stats()
+        if stats is not None:
+            # The repair is spread over _update and _compute: only the
+            # expansions and the queue size are counted
+            stats.unmeasured("generated", "duplicates", "heuristic_evaluations",
+                             "successor_time", "heuristic_time", "queue_time")
+        if he in ("m", "e"):
+            he = "o"
+        if (problem.world is not self.world or
+                self.context != (truck.type, he, tuple(problem.goal))):
+            self._start(problem, truck, he)
+        self.start = self.world.index(problem.init)
+        if self.start != self.last:
+            # The truck moved: the keys in the queue were computed with the
+            # heuristic from the old start
+            self.km += self.h_table[self.start]
+            self.last = self.start
+            self.h_table = h.heuristic_table(he, problem, goal=problem.init,
+                                             vehicle_type=truck.type)
+        changed, self.changed = self.changed, set()
+        for i in changed:
+            # The cost of entering i changed, so did the lookahead of the
+            # cells around it
+            for _, offset, _ in self.moves:
+                self._update(i - offset, observer)
+            self._update(i, observer)
+        self._compute(observer)
+        plan = self._plan()
+        if plan is None and self.g.get(self.start, math.inf) < math.inf:
+            # The repair left g with no way down to the goal: search again
+            self._start(problem, truck, he)
+            self.start = self.world.index(problem.init)
+            self._compute(observer)
+            plan = self._plan()
+        return plan
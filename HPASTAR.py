@@ -0,0 +1,338 @@
+import heapq
+import math
+from collections import deque
+from itertools import count
+from search_algorithm import SearchAlgorithm
+from path_finding import MOVES
+import heuristics as h
+
+
+class ClusterGraph(object):
+    """The abstract graph of HPA* over a World, for one vehicle profile.
+
+    The map is cut into size x size clusters. Where two neighbouring
+    clusters touch, every stretch of cells that can be crossed gets one
+    entrance (two, at its ends, if it is long): a pair of cells, one per
+    side, which become nodes of the graph joined by a single move. A
+    diagonal move can also cross a border (see PathFinding.moves): through
+    a gap between two walls, or at the corner of four clusters. Such a
+    crossing gets an entrance of its own when no straight crossing is next
+    to it. Inside each
+    cluster the nodes are joined by their distance moving inside it.
+
+    Every move costs one step, as in the maps the GUI builds. The graph
+    subscribes to the World: an edited cell marks its cluster, and before
+    the next query the borders of the marked clusters are scanned again
+    and only the clusters whose entrances changed are rebuilt.
+    """
+
+    def __init__(self, world, blocked, size=10):
+        self.world = world
+        self.blocked = blocked
+        self.size = size
+        self.clusters_x = world.x_lim // size + 1
+        self.clusters_y = world.y_lim // size + 1
+        stride = world.stride
+        self.offsets = [dx * stride + dy for dx, dy in MOVES.values()]
+        self.action = {dx * stride + dy: a for a, (dx, dy) in MOVES.items()}
+        # Entrance pairs (flat indices) of every border, keyed by its kind
+        # ('x' between (cx, cy) and (cx + 1, cy), 'y' between (cx, cy) and
+        # (cx, cy + 1), 'd' and 'a' across the corner) and its cluster
+        self.borders = {}
+        # Nodes across a border from each node
+        self.inter = {}
+        # For every cluster, the distances between its nodes
+        self.intra = {}
+        self.dirty = set()
+        for key in self._border_keys(0, self.clusters_x, 0, self.clusters_y):
+            self._build_border(key)
+        for cx in range(self.clusters_x):
+            for cy in range(self.clusters_y):
+                self._build_cluster((cx, cy))
+        world.subscribe(self._on_edit)
+
+    def cluster(self, i):
+        x, y = self.world.state(i)
+        return x // self.size, y // self.size
+
+    def _bounds(self, cluster):
+        s = self.size
+        return (cluster[0] * s, cluster[1] * s,
+                min((cluster[0] + 1) * s, self.world.x_lim + 1) - 1,
+                min((cluster[1] + 1) * s, self.world.y_lim + 1) - 1)
+
+    def _free(self, state):
+        return not self.world.flat[self.world.index(state)] & self.blocked
+
+    def _border_keys(self, x0, x1, y0, y1):
+        """Keys of the borders of the clusters (cx, cy), x0 <= cx < x1, y0 <= cy < y1"""
+        keys = []
+        for cx in range(max(x0, 0), min(x1, self.clusters_x)):
+            for cy in range(max(y0, 0), min(y1, self.clusters_y)):
+                right = cx + 1 < self.clusters_x
+                up = cy + 1 < self.clusters_y
+                if right:
+                    keys.append(("x", cx, cy))
+                if up:
+                    keys.append(("y", cx, cy))
+                if right and up:
+                    keys.append(("d", cx, cy))
+                    keys.append(("a", cx, cy))
+        return keys
+
+    def _build_border(self, key):
+        kind, cx, cy = key
+        s = self.size
+        x, y = (cx + 1) * s - 1, (cy + 1) * s - 1
+        free = self._free
+        if kind == "x":
+            line = [((x, v), (x + 1, v))
+                    for v in range(cy * s, min((cy + 1) * s, self.world.y_lim + 1))]
+            pairs = self._line_entrances(line)
+        elif kind == "y":
+            line = [((u, y), (u, y + 1))
+                    for u in range(cx * s, min((cx + 1) * s, self.world.x_lim + 1))]
+            pairs = self._line_entrances(line)
+        else:
+            if kind == "d":
+                a, b, others = (x, y), (x + 1, y + 1), ((x + 1, y), (x, y + 1))
+            else:
+                a, b, others = (x, y + 1), (x + 1, y), ((x, y), (x + 1, y + 1))
+            crossing = free(a) and free(b) and not (free(others[0]) or free(others[1]))
+            pairs = [(a, b)] if crossing else []
+        index = self.world.index
+        pairs = [(index(a), index(b)) for a, b in pairs]
+        old = self.borders.get(key, [])
+        for a, b in old:
+            self.inter[a].discard(b)
+            self.inter[b].discard(a)
+        for a, b in pairs:
+            self.inter.setdefault(a, set()).add(b)
+            self.inter.setdefault(b, set()).add(a)
+        self.borders[key] = pairs
+        return pairs != old
+
+    def _line_entrances(self, line):
+        """Entrances along a straight border, given as its (a, b) cell pairs"""
+        free = self._free
+        open_ = [free(a) and free(b) for a, b in line]
+        pairs = []
+        k = 0
+        while k < len(line):
+            if not open_[k]:
+                k += 1
+                continue
+            end = k
+            while end + 1 < len(line) and open_[end + 1]:
+                end += 1
+            if end - k < 5:
+                pairs.append(line[(k + end) // 2])
+            else:
+                pairs.append(line[k])
+                pairs.append(line[end])
+            k = end + 1
+        for k in range(len(line) - 1):
+            if not open_[k] and not open_[k + 1]:
+                (a0, b0), (a1, b1) = line[k], line[k + 1]
+                if free(a0) and free(b1):
+                    pairs.append((a0, b1))
+                if free(a1) and free(b0):
+                    pairs.append((a1, b0))
+        return pairs
+
+    def nodes(self, cluster):
+        cx, cy = cluster
+        nodes = set()
+        for key in self._border_keys(cx - 1, cx + 1, cy - 1, cy + 1):
+            for pair in self.borders[key]:
+                for i in pair:
+                    if self.cluster(i) == cluster:
+                        nodes.add(i)
+        return nodes
+
+    def _build_cluster(self, cluster):
+        distances = {}
+        nodes = self.nodes(cluster)
+        for node in nodes:
+            dist = self.search(node, cluster)[0]
+            distances[node] = {other: dist[other] for other in nodes
+                               if other != node and other in dist}
+        self.intra[cluster] = distances
+
+    def search(self, source, cluster):
+        """Breadth-first search from source moving inside cluster.
+
+        Returns the distances and the parents (previous cell) of the cells
+        reached. source itself may be a cell the vehicle cannot enter.
+        """
+        x0, y0, x1, y1 = self._bounds(cluster)
+        flat, blocked, stride = self.world.flat, self.blocked, self.world.stride
+        dist = {source: 0}
+        parent = {source: None}
+        queue = deque([source])
+        while queue:
+            i = queue.popleft()
+            d = dist[i] + 1
+            for offset in self.offsets:
+                j = i + offset
+                if j in dist or flat[j] & blocked:
+                    continue
+                x, y = j // stride - 1, j % stride - 1
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    dist[j] = d
+                    parent[j] = i
+                    queue.append(j)
+        return dist, parent
+
+    def _on_edit(self, state):
+        if 0 <= state[0] <= self.world.x_lim and 0 <= state[1] <= self.world.y_lim:
+            self.dirty.add((state[0] // self.size, state[1] // self.size))
+
+    def repair(self):
+        """Rebuild what the edits since the last query invalidated"""
+        rebuild = set(self.dirty)
+        keys = set()
+        for cx, cy in self.dirty:
+            keys.update(self._border_keys(cx - 1, cx + 1, cy - 1, cy + 1))
+        for key in keys:
+            if self._build_border(key):
+                kind, cx, cy = key
+                rebuild.update(self.cluster(i) for pair in self.borders[key] for i in pair)
+                rebuild.update({"x": [(cx, cy), (cx + 1, cy)], "y": [(cx, cy), (cx, cy + 1)],
+                                "d": [(cx, cy), (cx + 1, cy + 1)],
+                                "a": [(cx, cy + 1), (cx + 1, cy)]}[kind])
+        for cluster in rebuild:
+            self._build_cluster(cluster)
+        self.dirty = set()
+
+    def path(self, u, v, cluster, parent=None):
+        """Actions from u to v, moving inside cluster"""
+        if v - u in self.action:
+            return [self.action[v - u]]
+        if parent is None:
+            parent = self.search(u, cluster)[1]
+        plan = []
+        while v != u:
+            p = parent[v]
+            plan.append(self.action[v - p])
+            v = p
+        plan.reverse()
+        return plan
+
+
+def cluster_graph(world, vehicle_type, size=10):
+    """The ClusterGraph of a World for a vehicle profile, kept across edits"""
+    blocked = world.blocked(vehicle_type)
+    return world.maintained(("hpa", blocked, size),
+                            lambda: ClusterGraph(world, blocked, size))
+
+
+class HPAStar(SearchAlgorithm):
+    """Hierarchical path-finding A* (HPA*).
+
+    The start and the goal are linked to the nodes of their clusters, A*
+    runs on the abstract graph of cluster_graph and only the chosen
+    corridor is refined into actions, one cluster at a time. Plans are
+    close to optimal but not always optimal: inside a cluster a path
+    cannot leave it, and the entrances are only a sample of the border.
+
+    expanded counts the abstract nodes expanded plus the cells visited by
+    the searches inside the clusters.
+    """
+
+    def __init__(self, view=False, size=10) -> None:
+        self.size = size
+        super().__init__(view)
+
+    def solve(self, problem, truck, he="m", observer=None) -> list:
+        stats = self.start_stats()
+        world = problem.world
+        graph = cluster_graph(world, truck.type, self.size)
+        graph.repair()
+        start, goal = world.index(problem.init), world.index(problem.goal)
+        if start == goal:
+            return []
+        if not world.is_free(problem.goal, truck.type):
+            return None
+        search, heuristic_table = graph.search, h.heuristic_table
+        push, pop = heapq.heappush, heapq.heappop
+        if stats is not None:
+            search = stats.timed(search, "successor_time")
+            heuristic_table = stats.timed(heuristic_table, "heuristic_time")
+            push, pop = stats.timed(push, "queue_time"), stats.timed(pop, "queue_time")
+        start_cluster, goal_cluster = graph.cluster(start), graph.cluster(goal)
+        start_dist, start_parent = search(start, start_cluster)
+        goal_dist, goal_parent = search(goal, goal_cluster)
+        self.expanded += len(start_dist) + len(goal_dist)
+        if stats is not None:
+            stats.expanded += len(start_dist) + len(goal_dist)
+        start_edges = {n: start_dist[n] for n in graph.nodes(start_cluster) if n in start_dist}
+        if goal in start_dist:
+            start_edges[goal] = start_dist[goal]
+        # Distances from the goal are distances to it (PathFinding.moves)
+        to_goal = {n: goal_dist[n] for n in graph.nodes(goal_cluster) if n in goal_dist}
+
+        def successors(i):
+            """(node, distance) of the abstract graph edges from i"""
+            if i == start:
+                edges = list(start_edges.items())
+            else:
+                edges = list(graph.intra[graph.cluster(i)][i].items())
+                if i in to_goal:
+                    edges.append((goal, to_goal[i]))
+            edges += [(j, 1) for j in graph.inter.get(i, ())]
+            return edges
+
+        h_table = heuristic_table(he, problem, vehicle_type=truck.type)
+        if stats is not None:
+            successors = stats.successors(successors)
+            h_table = stats.counted(h_table)
+        tie = count()
+        best_g = {start: 0}
+        parent = {start: None}
+        frontier = [(h_table[start], next(tie), 0, start)]
+        found = False
+        while frontier:
+            _, _, g, i = pop(frontier)
+            if g > best_g[i]:
+                continue
+            if i == goal:
+                found = True
+                break
+            self.update_expanded(world.state(i))
+            for j, d in successors(i):
+                if g + d < best_g.get(j, math.inf):
+                    best_g[j] = g + d
+                    parent[j] = i
+                    push(frontier, (g + d + h_table[j], next(tie), g + d, j))
+                    if observer is not None:
+                        observer.open(world.state(j))
+                elif stats is not None:
+                    stats.duplicates += 1
+            self.update_frontier(len(frontier))
+            if observer is not None:
+                if i != start:
+                    observer.closed(world.state(i))
+                observer.step()
+        if not found:
+            return None
+
+        corridor = [goal]
+        while parent[corridor[-1]] is not None:
+            corridor.append(parent[corridor[-1]])
+        corridor.reverse()
+        plan = []
+        for u, v in zip(corridor, corridor[1:]):
+            if u == start:
+                plan += graph.path(u, v, start_cluster, start_parent)
+            elif v == goal and graph.cluster(u) == goal_cluster:
+                # Walk the goal search tree back from u
+                steps = []
+                while u != goal:
+                    p = goal_parent[u]
+                    steps.append(graph.action[p - u])
+                    u = p
+                plan += steps
+            else:
+                plan += graph.path(u, v, graph.cluster(u))
+        return plan
@@ -1,82 +1,143 @@
 import math
-from search_algorithm import SearchAlgorithm, Node
+from array import array
+from operator import itemgetter
+from search_algorithm import SearchAlgorithm
+from search_algorithm import SearchMemory
 import heuristics as h
 
 
-class AstarNode(Node):
-    def __init__(self, state, parent=None, action=None, g=0, h=0) -> None:
-        self.h = h
-        super().__init__(state, parent, action, g)
+class IDAStar(SearchAlgorithm):
+    """Iterative Deepening A*
 
-    def __lt__(self, other):
-        return self.g + self.h < other.g + other.h
+    Each iteration is a depth-first search bounded by g + w * h, run on an
+    explicit stack so long corridors cannot hit the recursion limit. Cycles
+    are detected against the states on the current path.
 
+    A transposition table keeps, for every state, the lowest g it was
+    reached with (the g of a SearchMemory) and the iteration that happened
+    in (a typed array indexed by cell). A state reached again with a higher
+    g is pruned, as is one reached again with the same g in the same
+    iteration: its subtree has already been searched with that bound. The
+    table survives across iterations, so subtrees are not re-expanded from
+    worse paths at every new bound.
+    """
 
-class IDAStar(SearchAlgorithm):
     def __init__(self, heuristic=lambda x, y: 0, view=False, w=1) -> None:
         self.heuristic = heuristic
         self.w = w
         super().__init__(view)
 
-    def solve(self, problem, draw, grid, he, truck) -> list:
-        start_node = AstarNode(
-            problem.init,
-            None,
-            None,
-            g=0,
-            h=h.choose_heuristic(he, problem.init, problem.goal)
-        )
-
-        bound = start_node.h
-        self.goal_node = None
-
+    def solve(self, problem, truck, he="m", observer=None) -> list:
+        stats = self.start_stats()
+        heuristic_table = h.heuristic_table
+        if stats is not None:
+            heuristic_table = stats.timed(heuristic_table, "heuristic_time")
+        h_table = heuristic_table(he, problem, vehicle_type=truck.type)
+        if stats is not None:
+            h_table = stats.counted(h_table)
+        world = problem.world
+        start, goal = world.index(problem.init), world.index(problem.goal)
+        if start == goal:
+            return []
+        memory = SearchMemory(world.cells.size, problem.actions)
+        iterations = array('i', [0]) * world.cells.size
+        memory.g[start] = 0
+        # With integer step costs every plan costs an integer, so the bound
+        # can be rounded up to one: no cheaper plan is skipped, and a
+        # real-valued heuristic (euclidean) cannot raise the bound by a
+        # hair per iteration
+        integral = all(isinstance(c, int) for _, c in problem.cost)
+        bound = self.w * h_table[start]
+        if integral:
+            bound = math.ceil(bound)
+        iteration = 0
         while True:
-            visited = set()
-            next_bound = self._search(
-                start_node, bound, visited, problem, draw, grid, he, truck)
-
-            if self.goal_node:
-                return self.extract_solution(self.goal_node)
+            iteration += 1
+            if stats is not None:
+                stats.iterations = iteration
+            found, next_bound = self._search(
+                problem, truck, h_table, memory, iterations, bound, iteration, observer)
+            if found:
+                return memory.plan(goal)
             if next_bound == math.inf:
-                return []
-            bound = next_bound
-
-    def _search(self, node, bound, visited, problem, draw, grid, he, truck):
-        if node.state in visited:
-            return math.inf
-        visited.add(node.state)
-
-        f = node.g + self.w * node.h
-        if f > bound:
-            return f
-        if problem.isGoal(node.state):
-            self.goal_node = node
-            return "found"
-
-        min_threshold = math.inf
-        states = problem.getSuccessors(node.state, truck)
-
-        states.sort(key=lambda x: h.choose_heuristic(he, x[1], problem.goal))
-
-        for action, succ_state in states:
-            child_h = h.choose_heuristic(he, succ_state, problem.goal)
-            child_node = AstarNode(
-                succ_state, node, action, node.g + 1, child_h)
-            if child_node.state in visited or self.is_expanded(child_node.state):
+                return None
+            bound = math.ceil(next_bound) if integral else next_bound
+
+    def _children(self, neighbours, h_table, i):
+        """Successors as (h, action code, index)"""
+        indices, codes = neighbours(i)
+        return [(h_table[j], code, j) for j, code in zip(indices, codes)]
+
+    def _push(self, stack, children):
+        """Push children on the stack, to be popped in increasing h"""
+        children.sort(key=itemgetter(0))
+        children.reverse()
+        stack.append(children)
+
+    def _search(self, problem, truck, h_table, memory, iterations, bound, iteration, observer):
+        w = self.w
+        cost = dict(problem.cost)
+        costs = [cost[a] for a in problem.actions]
+        world = problem.world
+        state = world.state
+        neighbours = problem.neighbours(truck).neighbours
+        children, push = self._children, self._push
+        stats = self.stats
+        if stats is not None:
+            neighbours = stats.successors(neighbours)
+            push = stats.timed(push, "queue_time")
+        best_g, parent, action = memory.g, memory.parent, memory.action
+        start, goal = world.index(problem.init), world.index(problem.goal)
+        path = [start]
+        on_path = bytearray(world.cells.size)
+        on_path[start] = 1
+        g_path = [0]
+        stack = []
+        push(stack, children(neighbours, h_table, start))
+        next_bound = math.inf
+        while stack:
+            top = stack[-1]
+            if not top:
+                stack.pop()
+                i = path.pop()
+                on_path[i] = 0
+                g_path.pop()
+                if observer is not None:
+                    if path:
+                        observer.open(state(i))
+                    observer.step()
                 continue
 
-            self.update_expanded(succ_state)
-            grid[succ_state[0]][succ_state[1]].make_closed()
-
-            result = self._search(
-                child_node, bound, visited, problem, draw, grid, he, truck)
-
-            if result == "found":
-                return "found"
-            if result < min_threshold:
-                min_threshold = result
-
-            grid[succ_state[0]][succ_state[1]].make_open()
-
-        draw()
-        return min_threshold
+            child_h, code, j = top.pop()
+            if on_path[j]:
+                continue
+            g = g_path[-1] + costs[code]
+            f = g + w * child_h
+            if f > bound:
+                if f < next_bound:
+                    next_bound = f
+                continue
+            if g > best_g[j] or (g == best_g[j] and iterations[j] == iteration):
+                if stats is not None:
+                    stats.duplicates += 1
+                continue
+            best_g[j] = g
+            iterations[j] = iteration
+            # Only states pushed on the path get a parent, and a state on
+            # the path is never pushed again: the parents of the path are
+            # always the path itself
+            parent[j] = path[-1]
+            action[j] = code
+
+            if j == goal:
+                return True, None
+
+            self.update_expanded(state(j))
+            if observer is not None:
+                observer.closed(state(j))
+            path.append(j)
+            on_path[j] = 1
+            g_path.append(g)
+            self.update_frontier(len(path))
+            push(stack, children(neighbours, h_table, j))
+        return False, next_bound
@@ -0,0 +1,220 @@
+import heapq
+import math
+from itertools import count
+import numpy as np
+from search_algorithm import SearchAlgorithm
+from path_finding import MOVES
+import heuristics as h
+
+STRAIGHT = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+DIAGONAL = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+# Action name of every unit direction
+ACTION = {move: a for a, move in MOVES.items()}
+
+
+def _at(a, dx, dy):
+    """b[x, y] = a[x + dx, y + dy]; the padded border makes wrapping harmless"""
+    return np.roll(a, (-dx, -dy), axis=(0, 1))
+
+
+def _scan(free, jump_point, dx, dy):
+    """Jump and reach distances of every cell in direction (dx, dy).
+
+    jump[c] is the number of steps to the first jump point met moving from
+    c, or 0 if a wall comes first; reach[c] is the number of free cells
+    before that wall. The cells are processed a whole line at a time, from
+    the far end of the direction back.
+    """
+    jump = np.zeros(free.shape, dtype=np.int32)
+    reach = np.zeros(free.shape, dtype=np.int32)
+    axis, step, shift = (0, dx, dy) if dx != 0 else (1, dy, dx)
+    size = free.shape[axis]
+    lines = range(size - 2, 0, -1) if step > 0 else range(1, size - 1)
+    for line in lines:
+        nxt = line + step
+        if axis == 0:
+            f, jp = free[nxt], jump_point[nxt]
+            jn, rn = jump[nxt], reach[nxt]
+        else:
+            f, jp = free[:, nxt], jump_point[:, nxt]
+            jn, rn = jump[:, nxt], reach[:, nxt]
+        if shift:
+            f, jp, jn, rn = (np.roll(v, -shift) for v in (f, jp, jn, rn))
+        j = np.where(f, np.where(jp, 1, np.where(jn > 0, jn + 1, 0)), 0)
+        r = np.where(f, rn + 1, 0)
+        if axis == 0:
+            jump[line], reach[line] = j, r
+        else:
+            jump[:, line], reach[:, line] = j, r
+    return jump, reach
+
+
+class JumpTable(object):
+    """JPS+ jump distances of a World for one vehicle profile.
+
+    For each of the eight directions and every cell, the distance to the
+    next jump point and the number of free steps before a wall, stored as
+    flat lists indexed like the World occupancy grid. Diagonal moves are
+    allowed between blocked cells, as in PathFinding.
+    """
+
+    def __init__(self, world, blocked):
+        free = (world.cells & blocked) == 0
+        self.free = free.reshape(-1).tolist()
+        self.jump = {}
+        self.reach = {}
+        tables = {}
+        for dx, dy in STRAIGHT:
+            if dx:
+                forced = (~_at(free, 0, 1) & _at(free, dx, 1)) | \
+                    (~_at(free, 0, -1) & _at(free, dx, -1))
+            else:
+                forced = (~_at(free, 1, 0) & _at(free, 1, dy)) | \
+                    (~_at(free, -1, 0) & _at(free, -1, dy))
+            tables[(dx, dy)] = _scan(free, free & forced, dx, dy)
+        for dx, dy in DIAGONAL:
+            forced = (~_at(free, -dx, 0) & _at(free, -dx, dy)) | \
+                (~_at(free, 0, -dy) & _at(free, dx, -dy))
+            jump_point = free & (forced | (tables[(dx, 0)][0] > 0) | (tables[(0, dy)][0] > 0))
+            tables[(dx, dy)] = _scan(free, jump_point, dx, dy)
+        for direction, (jump, reach) in tables.items():
+            self.jump[direction] = jump.reshape(-1).tolist()
+            self.reach[direction] = reach.reshape(-1).tolist()
+
+
+def _directions(free, i, stride, direction):
+    """Directions worth exploring from cell i reached moving in direction"""
+    if direction is None:
+        return STRAIGHT + DIAGONAL
+    dx, dy = direction
+    if dx and dy:
+        dirs = [(0, dy), (dx, 0), (dx, dy)]
+        if not free[i - dx * stride]:
+            dirs.append((-dx, dy))
+        if not free[i - dy]:
+            dirs.append((dx, -dy))
+    elif dx:
+        dirs = [(dx, 0)]
+        if not free[i + 1]:
+            dirs.append((dx, 1))
+        if not free[i - 1]:
+            dirs.append((dx, -1))
+    else:
+        dirs = [(0, dy)]
+        if not free[i + stride]:
+            dirs.append((1, dy))
+        if not free[i - stride]:
+            dirs.append((-1, dy))
+    return dirs
+
+
+def _sign(v):
+    return (v > 0) - (v < 0)
+
+
+class JPS(SearchAlgorithm):
+    """Jump Point Search (JPS+)
+
+    A* over jump points only: on a uniform-cost 8-connected grid every other
+    cell lies on a straight or diagonal segment that some symmetric optimal
+    path crosses without branching. The jump distances are precomputed once
+    per World and vehicle profile (JumpTable), so a jump is a table lookup;
+    the goal is caught when it lies on a jump segment. Plans are expanded
+    back to one action per cell.
+    """
+
+    def __init__(self, view=False, w=1) -> None:
+        self.w = w
+        super().__init__(view)
+
+    def jump_table(self, problem, truck):
+        world = problem.world
+        blocked = world.blocked(truck.type)
+        return world.derived(("jps", blocked), lambda: JumpTable(world, blocked))
+
+    def solve(self, problem, truck, he="m", observer=None) -> list:
+        world = problem.world
+        table = self.jump_table(problem, truck)
+        free, jump, reach = table.free, table.jump, table.reach
+        stride = world.stride
+        cost = dict(problem.cost)
+        step_cost = {d: cost[ACTION[d]] for d in STRAIGHT + DIAGONAL}
+        stats = self.start_stats()
+        heuristic_table, push, pop = h.heuristic_table, heapq.heappush, heapq.heappop
+        if stats is not None:
+            heuristic_table = stats.timed(heuristic_table, "heuristic_time")
+            push, pop = stats.timed(push, "queue_time"), stats.timed(pop, "queue_time")
+        h_table = heuristic_table(he, problem, vehicle_type=truck.type)
+        if stats is not None:
+            h_table = stats.counted(h_table)
+        w = self.w
+        gx, gy = problem.goal
+        goal = world.index(problem.goal)
+        start = world.index(problem.init)
+        if start == goal:
+            return []
+
+        def successors(i, direction):
+            """The jumps from i as (direction, steps), stopping at the goal"""
+            x, y = world.state(i)
+            jumps = []
+            for d in _directions(free, i, stride, direction):
+                dx, dy = d
+                steps = 0
+                if dx and dy:
+                    if _sign(gx - x) == dx and _sign(gy - y) == dy:
+                        t = min(abs(gx - x), abs(gy - y))
+                        if t <= reach[d][i] and (jump[d][i] == 0 or t <= jump[d][i]):
+                            steps = t
+                else:
+                    t = abs(gx - x) + abs(gy - y)
+                    aligned = (gy == y and _sign(gx - x) == dx) if dx else \
+                        (gx == x and _sign(gy - y) == dy)
+                    if aligned and t <= reach[d][i] and (jump[d][i] == 0 or t <= jump[d][i]):
+                        steps = t
+                if not steps:
+                    steps = jump[d][i]
+                    if not steps:
+                        continue
+                jumps.append((d, steps))
+            return jumps
+
+        if stats is not None:
+            successors = stats.successors(successors)
+        tie = count()
+        best_g = {start: 0}
+        parent = {start: None}
+        frontier = [(w * h_table[start], next(tie), 0, start, None)]
+        while frontier:
+            _, _, g, i, direction = pop(frontier)
+            if g > best_g[i]:
+                continue
+            if i == goal:
+                return self._plan(parent, goal)
+            self.update_expanded(world.state(i))
+            for d, steps in successors(i, direction):
+                dx, dy = d
+                j = i + steps * (dx * stride + dy)
+                child_g = g + steps * step_cost[d]
+                if child_g < best_g.get(j, math.inf):
+                    best_g[j] = child_g
+                    parent[j] = (i, d, steps)
+                    push(frontier, (child_g + w * h_table[j], next(tie), child_g, j, d))
+                    if observer is not None:
+                        observer.open(world.state(j))
+                elif stats is not None:
+                    stats.duplicates += 1
+            self.update_frontier(len(frontier))
+            if observer is not None:
+                if parent[i] is not None:
+                    observer.closed(world.state(i))
+                observer.step()
+        return None
+
+    def _plan(self, parent, i):
+        plan = []
+        while parent[i] is not None:
+            i, d, steps = parent[i]
+            plan.extend([ACTION[d]] * steps)
+        plan.reverse()
+        return plan
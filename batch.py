@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from path_finding import PathFinding
+import solver
+from vehicle import Vehicle
+
+
+def process_pool(workers=None):
+    """A ProcessPoolExecutor for solving queries.
+
+    Workers are forked where possible, so they do not re-import the main
+    script, which for the GUI would open a new window in every worker.
+    """
+    context = None
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def solve_query(world, start, goal, vehicle_type, algorithm, heuristic):
+    """solver.solve for one query, as a task for process_pool"""
+    return solver.solve(PathFinding(start, goal, world), vehicle_type, algorithm, heuristic)
+
+
+def _solve_chunk(world, queries, algorithm, heuristic):
+    """Solve (start, goal, vehicle type) queries in order on one World.
+
+    Runs in the worker processes: the World arrives without its derived
+    tables, which are then built once for the whole chunk.
+    """
+    return [solve_query(world, start, goal, vehicle_type, algorithm, heuristic)
+            for start, goal, vehicle_type in queries]
+
+
+def _chunks(items, n):
+    size = -(-len(items) // n)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def solve_batch(world, queries, algorithm="ASTAR", heuristic="m", workers=None, share_goals=False) -> list:
+    """Solve many (start, goal, vehicle) queries against one World.
+
+    vehicle is a Vehicle or a vehicle type string. Results (solver.Result)
+    come back in the order of the queries.
+
+    Queries are grouped by vehicle type, so that each worker builds the
+    neighbour and heuristic tables of a profile once, and spread over a
+    pool of workers processes (os.cpu_count() by default). With workers=0,
+    or when there is too little to split, everything runs in this process.
+
+    share_goals trades the requested algorithm for speed: queries sharing
+    their goal and vehicle type are then answered together by the FIELD
+    solver, from one reverse distance field per group (one breadth-first
+    search, optimal plans), and their Results say FIELD.
+    """
+    queries = [(tuple(start), tuple(goal), v.type if isinstance(v, Vehicle) else v)
+               for start, goal, v in queries]
+    results = [None] * len(queries)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # Tasks as (query indices, algorithm, heuristic), each solved in order
+    # by one worker
+    tasks = []
+    remaining = list(range(len(queries)))
+    if share_goals:
+        by_goal = defaultdict(list)
+        for i, (_, goal, vehicle_type) in enumerate(queries):
+            by_goal[(goal, vehicle_type)].append(i)
+        remaining = []
+        for group in by_goal.values():
+            if len(group) > 1:
+                tasks.append((group, "FIELD", "-"))
+            else:
+                remaining.extend(group)
+
+    by_vehicle = defaultdict(list)
+    for i in sorted(remaining):
+        by_vehicle[queries[i][2]].append(i)
+    for group in by_vehicle.values():
+        tasks.extend((chunk, algorithm, heuristic) for chunk in _chunks(group, max(1, workers)))
+
+    if workers <= 1 or len(tasks) <= 1:
+        for task, task_algorithm, task_heuristic in tasks:
+            chunk = _solve_chunk(world, [queries[i] for i in task], task_algorithm, task_heuristic)
+            for i, result in zip(task, chunk):
+                results[i] = result
+    else:
+        with process_pool(workers) as pool:
+            futures = [(task, pool.submit(_solve_chunk, world, [queries[i] for i in task],
+                                          task_algorithm, task_heuristic))
+                       for task, task_algorithm, task_heuristic in tasks]
+            for task, future in futures:
+                for i, result in zip(task, future.result()):
+                    results[i] = result
+    return results
@@ -0,0 +1,158 @@
+import csv
+import glob
+import json
+import os
+import statistics
+import tracemalloc
+import click
+from heuristics import HEURISTICS
+from path_finding import PathFinding
+import solver
+from vehicle import VEHICLES
+from world import load_map
+
+FIELDS = ["map", "algorithm", "heuristic", "vehicle", "runs", "solved", "cost",
+          "expanded", "max_frontier", "time_min_ms", "time_median_ms",
+          "time_mean_ms", "peak_memory_kb"]
+
+
+def configurations(maps, algorithms, heuristics, vehicles):
+    """Every (map, algorithm, heuristic, vehicle) to measure.
+
+    Solvers that ignore the heuristic are run once per map and vehicle.
+    """
+    for filename in maps:
+        for algorithm in algorithms:
+            if solver.make_solver(algorithm).uses_heuristic:
+                hs = heuristics
+            else:
+                hs = ["-"]
+            for he in hs:
+                for vehicle in vehicles:
+                    yield filename, algorithm, he, vehicle
+
+
+def fresh_problem(filename):
+    """The query of a map on a World of its own, so no table it caches is warm"""
+    world, start, end = load_map(filename)
+    return PathFinding(start, end, world)
+
+
+def peak_memory(problem, vehicle, algorithm, he):
+    tracemalloc.start()
+    try:
+        solver.solve(problem, vehicle, algorithm, he)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_configuration(filename, algorithm, he, vehicle, repeat):
+    times = []
+    first = None
+    for _ in range(repeat):
+        result = solver.solve(fresh_problem(filename), vehicle, algorithm, he)
+        times.append(result.elapsed * 1000)
+        if first is None:
+            first = result
+    # tracemalloc slows the search down, so memory gets its own run
+    memory = peak_memory(fresh_problem(filename), vehicle, algorithm, he)
+    return {
+        "map": os.path.basename(filename),
+        "algorithm": algorithm,
+        "heuristic": he,
+        "vehicle": vehicle,
+        "runs": repeat,
+        "solved": first.solved,
+        "cost": first.cost,
+        "expanded": first.expanded,
+        "max_frontier": first.max_frontier,
+        "time_min_ms": round(min(times), 3),
+        "time_median_ms": round(statistics.median(times), 3),
+        "time_mean_ms": round(statistics.mean(times), 3),
+        "peak_memory_kb": round(memory / 1024, 1),
+    }
+
+
+def record_key(record):
+    return (record["map"], record["algorithm"], record["heuristic"], record["vehicle"])
+
+
+def compare(records, baseline, tolerance):
+    """Match the records against a baseline report.
+
+    Returns the list of regressions as (record, baseline record, reasons).
+    """
+    previous = {record_key(r): r for r in baseline}
+    regressions = []
+    for record in records:
+        old = previous.get(record_key(record))
+        if old is None:
+            continue
+        reasons = []
+        if old["solved"] and not record["solved"]:
+            reasons.append("no longer solved")
+        elif record["cost"] is not None and old["cost"] is not None and record["cost"] > old["cost"]:
+            reasons.append("cost {} -> {}".format(old["cost"], record["cost"]))
+        if record["expanded"] > old["expanded"]:
+            reasons.append("expanded {} -> {}".format(
+                old["expanded"], record["expanded"]))
+        if record["time_median_ms"] > old["time_median_ms"] * (1 + tolerance):
+            reasons.append("time {:.1f}ms -> {:.1f}ms".format(
+                old["time_median_ms"], record["time_median_ms"]))
+        if reasons:
+            regressions.append((record, old, reasons))
+    return regressions
+
+
+def write_csv(records, filename):
+    with open(filename, "w", newline="") as data_file:
+        writer = csv.DictWriter(data_file, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+@click.command()
+@click.option('-m', '--maps', default="maps/*.json", help="Glob of the map files to run on")
+@click.option('-s', '--search_algorithm', 'algorithms', multiple=True,
+              default=list(solver.ALGORITHMS), help="Search algorithm(s) to benchmark")
+@click.option('-h', '--heuristic', 'heuristics', multiple=True,
+              default=list(HEURISTICS), type=click.Choice(list(HEURISTICS)), help="Heuristic(s) to benchmark")
+@click.option('-v', '--vehicle', 'vehicles', multiple=True,
+              default=VEHICLES, type=click.Choice(VEHICLES), help="Vehicle type(s) to benchmark")
+@click.option('-n', '--repeat', default=5, help="Timed runs per configuration")
+@click.option('-o', '--output', default="benchmark.json", help="JSON report to write")
+@click.option('--csv', 'csv_output', default=None, help="Also write the report as CSV")
+@click.option('-b', '--baseline', default=None, help="JSON report to compare against")
+@click.option('-t', '--tolerance', default=0.2, help="Allowed relative slowdown against the baseline")
+def main(maps, algorithms, heuristics, vehicles, repeat, output, csv_output, baseline, tolerance):
+    filenames = sorted(glob.glob(maps))
+    if not filenames:
+        raise click.ClickException("No map matches {}".format(maps))
+    records = []
+    for filename, algorithm, he, vehicle in configurations(
+            filenames, [a.upper() for a in algorithms],
+            [HEURISTICS[he] for he in heuristics], vehicles):
+        record = run_configuration(filename, algorithm, he, vehicle, repeat)
+        records.append(record)
+        click.echo("{map} {algorithm} {heuristic} {vehicle}: cost {cost}, "
+                   "{expanded} expanded, {time_median_ms:.1f}ms".format(**record))
+
+    with open(output, "w") as data_file:
+        json.dump(records, data_file, indent=4)
+    if csv_output is not None:
+        write_csv(records, csv_output)
+
+    if baseline is not None:
+        with open(baseline) as data_file:
+            regressions = compare(records, json.load(data_file), tolerance)
+        for record, _, reasons in regressions:
+            click.echo("REGRESSION {map} {algorithm} {heuristic} {vehicle}: ".format(
+                **record) + ", ".join(reasons))
+        if regressions:
+            raise SystemExit(1)
+        click.echo("No regressions against {}".format(baseline))
+
+
+if __name__ == '__main__':
+    main()
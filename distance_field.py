@@ -0,0 +1,101 @@
+import numpy as np
+from BRFS import distance_map
+from cache import LRUCache
+from search_algorithm import SearchAlgorithm
+
+
+class ReverseField(object):
+    """Distance to one goal from every cell of a World, for one vehicle profile.
+
+    Moves are symmetric (see PathFinding.moves), so the field is a
+    breadth-first wavefront grown from the goal. It is stored flat, indexed
+    like the World occupancy grid, with -1 on cells that cannot reach the goal
+    (every cell, if the vehicle cannot enter the goal).
+    """
+
+    def __init__(self, world, goal, vehicle_type):
+        self.world = world
+        self.goal = tuple(goal)
+        if world.is_free(goal, vehicle_type):
+            dist = distance_map(world, goal, vehicle_type)
+        else:
+            # Nothing can enter the goal
+            dist = np.full(world.cells.shape, -1, dtype=np.int32)
+        self.reached = int(np.count_nonzero(dist >= 0))
+        self.distances = dist.reshape(-1).tolist()
+
+    def distance(self, state):
+        return self.distances[self.world.index(state)]
+
+    def descend(self, start, moves):
+        """Plan from start to the goal, one step down the field at a time.
+
+        moves lists (action, flat index offset) in the order ties are broken
+        in. The start itself may be a cell the vehicle cannot enter (a
+        diesel truck parked in the ZTL): it is left through its best
+        neighbour. Returns None if the goal cannot be reached.
+        """
+        if tuple(start) == self.goal:
+            return []
+        dist = self.distances
+        i = self.world.index(start)
+        level = dist[i]
+        plan = []
+        if level < 0:
+            best = None
+            for a, offset in moves:
+                d = dist[i + offset]
+                if d >= 0 and (best is None or d < best[0]):
+                    best = (d, a, offset)
+            if best is None:
+                return None
+            level, a, offset = best
+            plan.append(a)
+            i += offset
+        while level > 0:
+            level -= 1
+            for a, offset in moves:
+                if dist[i + offset] == level:
+                    plan.append(a)
+                    i += offset
+                    break
+        return plan
+
+
+def reverse_fields(world, vehicle_type, maxsize=32):
+    """The LRU of ReverseFields the World keeps for a vehicle profile.
+
+    Editing walls or ZTL cells of the World drops it with everything else
+    derived from the map.
+    """
+    return world.derived(("reverse fields", world.blocked(vehicle_type)),
+                         lambda: LRUCache(maxsize))
+
+
+def reverse_field(world, goal, vehicle_type):
+    """The ReverseField of goal, built on first use and then cached"""
+    return reverse_fields(world, vehicle_type).get_or_build(
+        tuple(goal), lambda: ReverseField(world, goal, vehicle_type))
+
+
+class DistanceField(SearchAlgorithm):
+    """Plans by descending a cached reverse distance field of the goal.
+
+    The first query to a goal runs one breadth-first wavefront from the goal;
+    every later query to the same goal, from any start, costs time
+    proportional to the length of the plan. Plans are optimal. expanded
+    counts every cell the field reaches, whether this query built the field
+    or found it cached.
+    """
+
+    uses_heuristic = False
+
+    def solve(self, problem, truck, he=None, observer=None) -> list:
+        stats = self.start_stats()
+        field = reverse_field(problem.world, problem.goal, truck.type)
+        self.expanded = field.reached
+        if stats is not None:
+            # The wavefront works on whole arrays, not on single successors
+            stats.unmeasured("generated", "duplicates", "successor_time", "queue_time")
+            stats.expanded = field.reached
+        return field.descend(problem.init, [(m[0], m[3]) for m in problem.moves])
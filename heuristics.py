@@ -1,15 +1,10 @@
-import numpy as np
+from functools import lru_cache
+import math
 
-
-def choose_heuristic(he, start, end) -> int:
-    if he == "m":
-        return manhattan(start, end)
-    elif he == "c":
-        return chebyshev(start, end)
-    elif he == "e":
-        return eucledian(start, end)
-    elif he == "b":
-        return blind(start, end)
+# The one-letter names used by the solvers and the GUI, by the full names
+# used on the command line
+HEURISTICS = {"manhattan": "m", "chebyshev": "c", "euclidean": "e",
+              "octile": "o", "landmarks": "a", "blind": "b"}
 
 
 def manhattan(start, goal) -> int:
@@ -21,8 +16,75 @@ def chebyshev(start, goal) -> int:
 
 
 def eucledian(start, goal) -> int:
-    return np.sqrt(((abs(start[0]-goal[0]))**2)+(abs(start[1]-goal[1])**2))
+    return math.sqrt(((abs(start[0]-goal[0]))**2)+(abs(start[1]-goal[1])**2))
+
+
+def octile(start, goal, straight=1, diagonal=1) -> int:
+    dx = abs(start[0]-goal[0])
+    dy = abs(start[1]-goal[1])
+    return straight * (dx + dy) + (diagonal - 2 * straight) * min(dx, dy)
 
 
 def blind(start, goal) -> int:
     return 0
+
+
+def move_costs(problem):
+    """Cost of a straight and of a diagonal move of a PathFinding problem"""
+    cost = dict(problem.cost)
+    return cost.get('E', 1), cost.get('NE', 1)
+
+
+def heuristic_field(he, problem, goal=None, vehicle_type="electric"):
+    """h towards goal (problem.goal by default) for every cell, as one array.
+
+    The array is shaped like the World occupancy grid (padding included),
+    so it is indexed the same way. The geometric heuristics only depend on
+    the size of the map, on the goal and on the move costs, which is what
+    their cache is keyed on. The landmark heuristic ('a') depends on the
+    walls too and is cached by the World for each vehicle profile.
+    """
+    goal = problem.goal if goal is None else goal
+    if he == "a":
+        from landmarks import landmarks
+        return landmarks(problem.world, vehicle_type).field(goal)
+    return _field(he, problem.world.cells.shape, tuple(goal), move_costs(problem))
+
+
+def heuristic_table(he, problem, goal=None, vehicle_type="electric"):
+    """heuristic_field flattened to a list, for solvers to index with World.index"""
+    goal = problem.goal if goal is None else goal
+    if he == "a":
+        from landmarks import landmarks
+        return landmarks(problem.world, vehicle_type).table(goal)
+    return _table(he, problem.world.cells.shape, tuple(goal), move_costs(problem))
+
+
+@lru_cache(maxsize=32)
+def _field(he, shape, goal, costs):
+    # NumPy and the landmarks are only imported once a field is built, so
+    # the command line can read HEURISTICS without paying for them
+    import numpy as np
+    dx = np.abs(np.arange(shape[0]) - 1 - goal[0])[:, None]
+    dy = np.abs(np.arange(shape[1]) - 1 - goal[1])[None, :]
+    if he == "m":
+        field = dx + dy
+    elif he == "c":
+        field = np.maximum(dx, dy)
+    elif he == "e":
+        field = np.sqrt(dx ** 2 + dy ** 2)
+    elif he == "o":
+        straight, diagonal = costs
+        field = straight * (dx + dy) + (diagonal - 2 * straight) * np.minimum(dx, dy)
+    elif he == "b":
+        field = np.zeros(shape, dtype=int)
+    else:
+        raise ValueError("Unknown heuristic: {}".format(he))
+    field = np.broadcast_to(field, shape).copy()
+    field.flags.writeable = False
+    return field
+
+
+@lru_cache(maxsize=32)
+def _table(he, shape, goal, costs):
+    return _field(he, shape, goal, costs).reshape(-1).tolist()
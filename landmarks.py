@@ -0,0 +1,94 @@
+from collections import OrderedDict
+import numpy as np
+from BRFS import distance_map
+
+
+class Landmarks(object):
+    """ALT (A*, Landmarks, Triangle inequality) preprocessing of a World.
+
+    k landmarks are picked by farthest-point selection: the first is the
+    cell farthest from a cell of the largest connected area, each next one
+    the cell farthest from all the landmarks chosen so far. The exact
+    distances from every landmark are computed with the wavefront BFS of
+    BRFS.distance_map. As moves are symmetric (see PathFinding.moves), by
+    the triangle inequality |d(L, goal) - d(L, v)| is a lower bound on the
+    distance from v to the goal, and the heuristic is the largest bound
+    over the landmarks. Cells a landmark does not reach add no bound.
+    """
+
+    def __init__(self, world, vehicle_type, k=8, cached_goals=16):
+        self.world = world
+        self.vehicle_type = vehicle_type
+        passable = (world.cells & world.blocked(vehicle_type)) == 0
+        self.landmarks = []
+        self.distances = np.empty((0,) + world.cells.shape, dtype=np.int32)
+        nearest = self._largest_component(passable)
+        if nearest is not None:
+            self._add(np.unravel_index(np.argmax(nearest), nearest.shape))
+        while 0 < len(self.landmarks) < k:
+            reached = (self.distances >= 0).all(axis=0)
+            spread = np.where(reached, self.distances.min(axis=0), -1)
+            far = np.unravel_index(np.argmax(spread), spread.shape)
+            if spread[far] <= 0:
+                break
+            self._add(far)
+        self._fields = OrderedDict()
+        self._cached_goals = cached_goals
+
+    def _largest_component(self, passable):
+        """Distances from a cell of the largest connected area of the map.
+
+        Maps have small enclosed pockets: landmarks are only worth placing
+        in the area most queries run in.
+        """
+        unseen = passable.copy()
+        best = None
+        best_size = 0
+        while unseen.sum() > best_size:
+            seed = np.argwhere(unseen)[0]
+            dist = distance_map(self.world, (seed[0] - 1, seed[1] - 1), self.vehicle_type)
+            reached = dist >= 0
+            unseen &= ~reached
+            if reached.sum() > best_size:
+                best, best_size = dist, reached.sum()
+        return best
+
+    def _add(self, cell):
+        landmark = (int(cell[0]) - 1, int(cell[1]) - 1)
+        dist = distance_map(self.world, landmark, self.vehicle_type)
+        self.landmarks.append(landmark)
+        self.distances = np.concatenate((self.distances, dist[None]))
+
+    def field(self, goal):
+        """Lower bounds on the distance to goal of every cell, as one array"""
+        return self._entry(goal)[0]
+
+    def table(self, goal):
+        """field(goal) flattened to a list, indexed with World.index"""
+        entry = self._entry(goal)
+        if entry[1] is None:
+            entry[1] = entry[0].reshape(-1).tolist()
+        return entry[1]
+
+    def _entry(self, goal):
+        goal = tuple(goal)
+        if goal in self._fields:
+            self._fields.move_to_end(goal)
+            return self._fields[goal]
+        field = np.zeros(self.world.cells.shape, dtype=np.int32)
+        for dist in self.distances:
+            to_goal = dist[goal[0] + 1, goal[1] + 1]
+            if to_goal >= 0:
+                bound = np.where(dist >= 0, np.abs(dist - to_goal), 0)
+                np.maximum(field, bound, out=field)
+        field.flags.writeable = False
+        entry = self._fields[goal] = [field, None]
+        if len(self._fields) > self._cached_goals:
+            self._fields.popitem(last=False)
+        return entry
+
+
+def landmarks(world, vehicle_type, k=8):
+    """The Landmarks of a World for a vehicle profile, cached until it is edited"""
+    return world.derived(("landmarks", world.blocked(vehicle_type), k),
+                         lambda: Landmarks(world, vehicle_type, k))
@@ -0,0 +1,90 @@
+import json
+import struct
+import numpy as np
+from world import World, load_map
+
+# Binary maps: a fixed prefix (magic, format version, header length), a
+# JSON header with the start, the end and the background image, then the
+# World occupancy grid as raw uint8 cell flags, border included, aligned
+# so that it can be memory-mapped as it is
+EXTENSION = ".umap"
+MAGIC = b"UMAP"
+VERSION = 1
+PREFIX = struct.Struct("<4sHI")
+ALIGNMENT = 64
+
+
+def save(filename, world, start, end, background=None):
+    header = json.dumps({"rows": world.x_lim + 1, "shape": world.cells.shape,
+                         "start": start, "end": end,
+                         "background": background}).encode()
+    offset = -(-(PREFIX.size + len(header)) // ALIGNMENT) * ALIGNMENT
+    with open(filename, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        f.write(b"\0" * (offset - PREFIX.size - len(header)))
+        f.write(np.ascontiguousarray(world.cells, dtype=np.uint8).tobytes())
+
+
+def read_header(filename):
+    """The header of a binary map and the offset of its cells"""
+    with open(filename, "rb") as f:
+        magic, version, length = PREFIX.unpack(f.read(PREFIX.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a version {} binary map".format(filename, VERSION))
+        header = json.loads(f.read(length))
+    offset = -(-(PREFIX.size + length) // ALIGNMENT) * ALIGNMENT
+    return header, offset
+
+
+def load(filename):
+    """Memory-map a binary map.
+
+    Returns the World, the start and end cells and the background image
+    (None if the map has none). The cells are mapped copy-on-write, so
+    editing the World never changes the file, and nothing is read from
+    disk until a search looks at the cells.
+    """
+    header, offset = read_header(filename)
+    cells = np.memmap(filename, dtype=np.uint8, mode="c", offset=offset,
+                      shape=tuple(header["shape"]))
+    start = tuple(header["start"]) if header["start"] is not None else None
+    end = tuple(header["end"]) if header["end"] is not None else None
+    return World.from_cells(cells), start, end, header.get("background")
+
+
+def json_to_binary(source, target):
+    world, start, end = load_map(source)
+    with open(source) as f:
+        background = json.load(f).get("background")
+    save(target, world, start, end, background)
+
+
+def binary_to_json(source, target):
+    world, start, end, background = load(source)
+    data = {"rows": world.x_lim + 1, "start": start, "end": end,
+            "barrier": sorted(world.walls), "ztl": sorted(world.ztl)}
+    if background:
+        data["background"] = background
+    with open(target, "w") as f:
+        f.write(json.dumps(data, indent=4))
+
+
+def convert(source, target):
+    """Convert a map between the JSON and the binary format.
+
+    The direction is given by the extensions: SOURCE.json to TARGET.umap
+    or SOURCE.umap to TARGET.json.
+    """
+    if source.endswith(EXTENSION) and not target.endswith(EXTENSION):
+        binary_to_json(source, target)
+    elif target.endswith(EXTENSION) and not source.endswith(EXTENSION):
+        json_to_binary(source, target)
+    else:
+        raise ValueError("Exactly one of SOURCE and TARGET must be a {} file".format(EXTENSION))
+
+
+if __name__ == '__main__':
+    import sys
+    import urbanflow
+    sys.exit(urbanflow.main(["convert"] + sys.argv[1:]))
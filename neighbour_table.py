@@ -0,0 +1,56 @@
+import numpy as np
+
+
+class NeighbourTable(object):
+    """Successors of every cell of a World for one vehicle profile.
+
+    The table is stored CSR-style over the flat indices of the World
+    occupancy grid: the successors of cell i are indices[indptr[i]:indptr[i+1]]
+    and actions[...] holds, for each of them, the position of the action in
+    the action list the table was built with. Successor order follows that
+    list, so solvers see the same order as with a plain scan.
+    """
+
+    def __init__(self, world, blocked, actions, offsets):
+        self.world = world
+        self.action_names = list(actions)
+        cells = world.cells.reshape(-1)
+        free = (cells & blocked) == 0
+        inside = np.zeros(world.cells.shape, dtype=bool)
+        inside[1:-1, 1:-1] = True
+        inside = inside.reshape(-1)
+        origins = np.flatnonzero(inside)
+
+        valid = np.zeros((cells.size, len(offsets)), dtype=bool)
+        for k, offset in enumerate(offsets):
+            valid[origins, k] = free[origins + offset]
+        sources, codes = np.nonzero(valid)
+
+        self.indptr = np.zeros(cells.size + 1, dtype=np.int64)
+        np.cumsum(valid.sum(axis=1), out=self.indptr[1:])
+        self.indices = (sources + np.asarray(offsets)[codes]).astype(np.int64)
+        self.actions = codes.astype(np.uint8)
+
+        self._indptr = self.indptr.tolist()
+        self._indices = self.indices.tolist()
+        self._actions = self.actions.tolist()
+        self._pairs = [None] * cells.size
+
+    def neighbours(self, index):
+        """Flat indices and action codes of the successors of a flat index"""
+        start, end = self._indptr[index], self._indptr[index + 1]
+        return self._indices[start:end], self._actions[start:end]
+
+    def successors(self, index):
+        """Successors of a flat index as (action, state) pairs.
+
+        The list is built once per cell and shared: do not modify it.
+        """
+        pairs = self._pairs[index]
+        if pairs is None:
+            start, end = self._indptr[index], self._indptr[index + 1]
+            names, state = self.action_names, self.world.state
+            pairs = self._pairs[index] = [
+                (names[code], state(j)) for j, code in
+                zip(self._indices[start:end], self._actions[start:end])]
+        return pairs
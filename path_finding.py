@@ -6,56 +6,62 @@ from world import World
 # World is as defined in the imported class World,
 # so has limits given by x_lim and y_lim
 
+# Displacement of every action on (x, y)
+MOVES = {
+    'W': (-1, 0),
+    'E': (1, 0),
+    'S': (0, -1),
+    'N': (0, 1),
+    'NE': (1, 1),
+    'NW': (-1, 1),
+    'SE': (1, -1),
+    'SW': (-1, -1),
+}
+
+# Action that undoes each action
+OPPOSITE = {'W': 'E', 'E': 'W', 'S': 'N', 'N': 'S',
+            'NE': 'SW', 'SW': 'NE', 'NW': 'SE', 'SE': 'NW'}
+
 
 class PathFinding(SearchProblem):
     def __init__(self, init, goal, world: World):
         self.actions = ['W', 'E', 'S', 'N', 'NE', 'NW', 'SE', 'SW']
-        #  self.actions = ['W', 'E', 'S', 'N']
+        #  self.actions = ['W', 'E', 'S', 'N']
         self.world = world
+        # Each move as (action, dx, dy, offset in the world occupancy grid).
+        # Whether a move is allowed only depends on the cell it enters and
+        # every move has an opposite, so moves are symmetric between the
+        # cells a truck can enter: solvers rely on it to search from the
+        # goal and to treat distances from a cell as distances to it
+        self.moves = [(a, MOVES[a][0], MOVES[a][1],
+                       MOVES[a][0] * world.stride + MOVES[a][1]) for a in self.actions]
+        self.offsets = [m[3] for m in self.moves]
         super().__init__(init, goal, [(a, 1) for a in self.actions])
 
+    def neighbours(self, truck):
+        """The NeighbourTable of the world for the truck's vehicle profile"""
+        return self.world.neighbour_table(truck.type, self.actions, self.offsets)
+
     def getSuccessors(self, state, truck) -> set:
-        succ = []
-        for a in self.actions:
-            if a == 'S':
-                x = state[0]
-                y = state[1]-1
-                next = (x, y)
-            elif a == 'N':
-                x = state[0]
-                y = state[1]+1
-                next = (x, y)
-            elif a == 'W':
-                x = state[0]-1
-                y = state[1]
-                next = (x, y)
-            elif a == 'E':
-                x = state[0]+1
-                y = state[1]
-                next = (x, y)
-            elif a == 'NE':
-                x = state[0]+1
-                y = state[1]+1
-                next = (x, y)
-            elif a == 'NW':
-                x = state[0]-1
-                y = state[1]+1
-                next = (x, y)
-            elif a == 'SE':
-                x = state[0]+1
-                y = state[1]-1
-                next = (x, y)
-            elif a == 'SW':
-                x = state[0]-1
-                y = state[1]-1
-                next = (x, y)
-            if next not in self.world.walls and self.isInTheLimits(next):
-                if truck.type == "diesel":
-                    if next not in self.world.ztl:
-                        succ.append((a, next))
-                else:
-                    succ.append((a, next))
-        return succ
+        return list(self.neighbours(truck).successors(self.world.index(state)))
+
+    def getPredecessors(self, state, truck) -> set:
+        """States from which one action leads to state, with that action.
+
+        A state the truck cannot enter (a ZTL cell for a diesel truck) has
+        no predecessors; otherwise the predecessors are the neighbours the
+        truck can be in: the cells it can enter, plus init wherever that is.
+        """
+        if not self.world.is_free(state, truck.type):
+            return []
+        pred = [(OPPOSITE[a], s) for a, s in
+                self.neighbours(truck).successors(self.world.index(state))]
+        dx, dy = self.init[0] - state[0], self.init[1] - state[1]
+        if max(abs(dx), abs(dy)) == 1 and not self.world.is_free(self.init, truck.type):
+            for a, move in MOVES.items():
+                if move == (-dx, -dy):
+                    pred.append((a, self.init))
+        return pred
 
     def isInTheLimits(self, state):
         return state[0] >= 0 and state[0] <= self.world.x_lim and state[1] >= 0 and state[1] <= self.world.y_lim
@@ -1,12 +1,23 @@
+import threading
 import time
 import click
 import pygame
 import json
+import numpy as np
+import batch
 from path_finding import PathFinding
 from ASTAR import AStar as ASTARPathFinder
 from BRFS import BrFS as BRFSPathFinder
 from IDASTAR import IDAStar as IDASTARPathFinder
+from JPS import JPS as JPSPathFinder
+from DSTARLITE import DStarLite as DSTARLITEPathFinder
+from HPASTAR import HPAStar as HPASTARPathFinder
+from search_algorithm import QueueObserver, SearchAlgorithm, SearchCancelled, SearchObserver
 import heuristics
+import map_format
+import solver
+from vehicle import Vehicle
+from route_cache import RouteCache
 from world import World
 
 WIDTH = 1000
@@ -15,9 +26,12 @@ pygame.display.set_caption("Search Algorithm")
 pygame.init()
 
 FONT1 = pygame.font.SysFont("georgia", 21)
+FONT2 = pygame.font.SysFont("georgia", 14)
 total_cost = 0
 expanded_nodes = 0
 elapsed_time = 0
+# SearchStats of the last search shown, None if it collected none
+search_stats = None
 
 BASE_IMAGE = pygame.image.load("img/warehouse.png")
 BASE_SIZE = 3
@@ -37,9 +51,9 @@ TURQUOISE = (64, 224, 208)
 TRANSPARENT = (0, 0, 0, 0)
 
 
-class Truck:
+class Truck(Vehicle):
     def __init__(self, truck_type="electric"):
-        self.type = truck_type
+        super().__init__(truck_type)
         self.image = None
         self.load_image()
 
@@ -54,201 +68,298 @@ class Truck:
 truck = Truck("electric")
 
 
+# State codes of the cells of a Grid
+EMPTY = 0
+BARRIER = 1
+ZTL_CELL = 2
+OPEN = 3
+CLOSED = 4
+PATH = 5
+START = 6
+END = 7
+
+# RGBA drawn over the background for every state code. Barriers let the
+# background show through; start and end are drawn as images on top
+PALETTE = np.zeros((8, 4), dtype=np.uint8)
+PALETTE[ZTL_CELL] = (255, 0, 0, 191)
+PALETTE[OPEN] = GREEN + (255,)
+PALETTE[CLOSED] = RED + (255,)
+PALETTE[PATH] = PURPLE + (255,)
+
+
+class Grid:
+    """State of the cells shown on the map, one code per cell.
+
+    The states live in a rows x rows uint8 array; grid[i][j] gives a Spot,
+    a view on one entry. Writes record the bounding box of the changed
+    cells, so the renderer repaints only that area, and keep track of the
+    start and end cells, which are drawn as images.
+    """
+
+    def __init__(self, rows, width, state=None):
+        self.rows = rows
+        self.gap = width // rows
+        self.state = np.zeros((rows, rows), dtype=np.uint8) if state is None else state
+        self.sprites = {(int(i), int(j)) for i, j in np.argwhere(self.state >= START)}
+        self.dirty = None
+
+    def __getitem__(self, i):
+        return GridRow(self, i)
+
+    def __len__(self):
+        return self.rows
+
+    def __iter__(self):
+        return (self[i] for i in range(self.rows))
+
+    def copy(self):
+        return Grid(self.rows, self.gap * self.rows, self.state.copy())
+
+    def set(self, i, j, code):
+        if self.state[i, j] >= START:
+            self.sprites.discard((i, j))
+        if code >= START:
+            self.sprites.add((i, j))
+        self.state[i, j] = code
+        self.touch(i, j, i, j)
+
+    def touch(self, i0, j0, i1, j1):
+        """Mark cells [i0, i1] x [j0, j1] as changed"""
+        if self.dirty is None:
+            self.dirty = [i0, j0, i1, j1]
+        else:
+            d = self.dirty
+            self.dirty = [min(d[0], i0), min(d[1], j0), max(d[2], i1), max(d[3], j1)]
+
+    def take_dirty(self):
+        dirty, self.dirty = self.dirty, None
+        return dirty
+
+    def clear(self, *codes):
+        """Reset every cell in one of the states codes"""
+        mask = np.isin(self.state, codes)
+        if mask.any():
+            self.state[mask] = EMPTY
+            self.touch(0, 0, self.rows - 1, self.rows - 1)
+
+    def cells(self, code):
+        """(row, col) of the cells in state code"""
+        return [(int(i), int(j)) for i, j in np.argwhere(self.state == code)]
+
+    def fill(self, cells, code):
+        cells = [c for c in cells if 0 <= c[0] < self.rows and 0 <= c[1] < self.rows]
+        if cells:
+            self.state[tuple(np.array(cells).T)] = code
+
+
+class GridRow:
+    def __init__(self, grid, i):
+        self.grid = grid
+        self.i = i
+
+    def __getitem__(self, j):
+        return Spot(self.grid, self.i, j)
+
+    def __len__(self):
+        return self.grid.rows
+
+    def __iter__(self):
+        return (Spot(self.grid, self.i, j) for j in range(self.grid.rows))
+
+
 class Spot:
-    def __init__(self, row, col, width):
+    """One cell of a Grid"""
+
+    def __init__(self, grid, row, col):
+        self.grid = grid
         self.row = row
         self.col = col
-        self.x = row * width
-        self.y = col * width
-        self.color = WHITE
-        self.width = width
 
-        self.barrier = False
-        self.closed = False
-        self.open = False
-        self.path = False
-        self.start = False
-        self.end = False
+    def __eq__(self, other):
+        return (isinstance(other, Spot) and other.grid is self.grid and
+                other.row == self.row and other.col == self.col)
 
-        self.rotation = -90
-
-        self.ztl = False
+    def __hash__(self):
+        return hash((id(self.grid), self.row, self.col))
 
     def get_pos(self):
         return self.row, self.col
 
+    def _is(self, code):
+        return self.grid.state[self.row, self.col] == code
+
     def is_closed(self):
-        return self.closed
+        return self._is(CLOSED)
 
     def is_open(self):
-        return self.open
+        return self._is(OPEN)
 
     def is_barrier(self):
-        return self.barrier
+        return self._is(BARRIER)
 
     def is_start(self):
-        return self.start
+        return self._is(START)
 
     def is_end(self):
-        return self.end
+        return self._is(END)
 
     def is_path(self):
-        return self.path
+        return self._is(PATH)
 
     def is_ztl(self):
-        return self.ztl
+        return self._is(ZTL_CELL)
 
     def reset(self):
-        self.color = WHITE
-        self.barrier = False
-        self.closed = False
-        self.open = False
-        self.path = False
-        self.start = False
-        self.end = False
-        self.ztl = False
+        self.grid.set(self.row, self.col, EMPTY)
+
+    def _make(self, code):
+        if not self.is_end():
+            self.grid.set(self.row, self.col, code)
 
     def make_start(self):
-        if not self.end:
-            self.reset()
-            self.start = True
-            self.color = ORANGE
+        self._make(START)
 
     def make_closed(self):
-        if not self.end:
-            self.reset()
-            self.closed = True
-            self.color = RED
+        self._make(CLOSED)
 
     def make_open(self):
-        if not self.end:
-            self.reset()
-            self.open = True
-            self.color = GREEN
+        self._make(OPEN)
 
     def make_barrier(self):
-        if not self.end:
-            self.reset()
-            self.barrier = True
-            self.color = BLACK
+        self._make(BARRIER)
 
     def make_ztl(self):
-        if not self.end:
-            self.reset()
-            self.ztl = True
-            self.color = RED
+        self._make(ZTL_CELL)
 
     def make_end(self):
-        self.reset()
-        self.end = True
-        self.color = TURQUOISE
+        self.grid.set(self.row, self.col, END)
 
     def make_path(self):
-        if not self.end:
-            self.reset()
-            self.path = True
-            self.color = PURPLE
-
-    def draw(self, win):
-        cell_size = WIDTH // 50
-
-        if self.is_barrier():
-            s = pygame.Surface((self.width, self.width), pygame.SRCALPHA)
-            s.fill(TRANSPARENT)
-            win.blit(s, (self.x, self.y))
-
-        elif self.is_ztl():
-            s = pygame.Surface((self.width, self.width), pygame.SRCALPHA)
-            s.fill(RED_TRANS)
-            win.blit(s, (self.x, self.y))
-
-        elif self.is_open():
-            pygame.draw.rect(
-                win, GREEN, (self.x, self.y, self.width, self.width))
-
-        elif self.is_closed():
-            pygame.draw.rect(
-                win, RED, (self.x, self.y, self.width, self.width))
-
-        elif self.is_path():
-            pygame.draw.rect(
-                win, PURPLE, (self.x, self.y, self.width, self.width))
-
-        elif self.is_start():
-            truck_pixel_size = 3 * cell_size
-            scaled_truck = pygame.transform.scale(
-                truck.load_image(), (truck_pixel_size, truck_pixel_size))
-            scaled_truck = pygame.transform.rotate(
-                scaled_truck, self.rotation)
-            win.blit(scaled_truck, (self.x-cell_size, self.y-cell_size))
-
-        elif self.is_end():
-            base_pixel_size = BASE_SIZE * cell_size
-            scaled_base = pygame.transform.scale(
-                BASE_IMAGE, (base_pixel_size, base_pixel_size))
-            win.blit(scaled_base, (self.x-cell_size, self.y-cell_size))
+        self._make(PATH)
 
     def __str__(self):
         return "({},{})".format(self.row, self.col)
 
 
-def make_grid(rows, width):
-    grid = []
-    gap = width // rows
-    for i in range(rows):
-        grid.append([])
-        for j in range(width):
-            spot = Spot(i, j, gap)
-            grid[i].append(spot)
+def sprite_rect(cell, gap):
+    """Area covered by the truck or base image drawn on a cell"""
+    cell_size = WIDTH // 50
+    return pygame.Rect(int(cell[0] * gap) - cell_size, int(cell[1] * gap) - cell_size,
+                       3 * cell_size, 3 * cell_size)
 
-    return grid
 
+def draw_sprite(win, cell, code, gap):
+    cell_size = WIDTH // 50
+    position = (int(cell[0] * gap) - cell_size, int(cell[1] * gap) - cell_size)
+    if code == START:
+        truck_pixel_size = 3 * cell_size
+        scaled_truck = pygame.transform.scale(
+            truck.load_image(), (truck_pixel_size, truck_pixel_size))
+        scaled_truck = pygame.transform.rotate(scaled_truck, -90)
+        win.blit(scaled_truck, position)
+    elif code == END:
+        base_pixel_size = BASE_SIZE * cell_size
+        scaled_base = pygame.transform.scale(
+            BASE_IMAGE, (base_pixel_size, base_pixel_size))
+        win.blit(scaled_base, position)
 
-def make_grid_from_file(filename, width):
+
+def make_grid(rows, width):
+    return Grid(rows, width)
+
+
+def read_map(filename):
+    """rows, start, end, barrier, ztl and background image of a map file"""
+    if filename.endswith(map_format.EXTENSION):
+        world, start, end, background = map_format.load(filename)
+        return world.x_lim + 1, start, end, world.walls, world.ztl, background
     f = open(filename)
 
     data = json.load(f)
 
     rows = data['rows']
-    grid = []
-    gap = width // rows
-
     start = (data['start'][0], data['start'][1])
     end = (data['end'][0], data['end'][1])
 
     barrier = {(ele[0], ele[1]) for ele in data['barrier']}
 
+    ztl = set()
+    if 'ztl' in data:
+        ztl = {(i, j) for i, j in data['ztl']}
+    return rows, start, end, barrier, ztl, data.get('background')
+
+
+def load_background(filename):
     background_image = None
-    if 'background' in data and data['background']:
+    if filename:
         try:
-            background_image = pygame.image.load(
-                data['background'])
+            background_image = pygame.image.load(filename)
             background_image = pygame.transform.scale(
                 background_image, (WIDTH-200, WIDTH-200))
         except pygame.error as e:
             print(f"Errore nel caricare l'immagine di background: {e}")
+    return background_image
+
+
+def build_grid(rows, width, start, end, barrier, ztl):
+    grid = Grid(rows, width)
+    # Later writes win: a barrier hides the start, which hides the end,
+    # which hides a ZTL cell
+    grid.fill(ztl, ZTL_CELL)
+    for cell, code in ((end, END), (start, START)):
+        if 0 <= cell[0] < rows and 0 <= cell[1] < rows and tuple(cell) not in barrier:
+            grid.set(cell[0], cell[1], code)
+    grid.fill(barrier, BARRIER)
+    grid.sprites = {c for c in grid.sprites if grid.state[c] >= START}
+    grid.dirty = None
+    if grid.state[start[0], start[1]] == START:
+        start = grid[start[0]][start[1]]
+    if grid.state[end[0], end[1]] == END:
+        end = grid[end[0]][end[1]]
+    return grid, start, end
 
-    ztl = set()
-    if 'ztl' in data:
-        ztl = {(i, j) for i, j in data['ztl']}
 
-    for i in range(rows):
-        grid.append([])
-        for j in range(rows):
-            spot = Spot(i, j, gap)
-            if (i, j) in barrier:
-                spot.make_barrier()
-            elif (i, j) == start:
-                spot.make_start()
-                start = spot
-            elif (i, j) == end:
-                spot.make_end()
-                end = spot
-            elif (i, j) in ztl:
-                spot.make_ztl()
-            grid[i].append(spot)
-
-    return grid, start, end, rows, barrier, background_image, ztl
+def make_grid_from_file(filename, width):
+    rows, start, end, barrier, ztl, background = read_map(filename)
+    grid, start, end = build_grid(rows, width, start, end, barrier, ztl)
+    return grid, start, end, rows, barrier, load_background(background), ztl
+
+
+class MapRepository:
+    """The maps of the map buttons, each read from disk only once.
+
+    The first load of a map keeps its grid as a template, together with
+    the scaled background surface; later loads hand out a copy of the
+    template, which is all the map switching costs.
+    """
+
+    def __init__(self):
+        self._maps = {}
+        self._backgrounds = {}
+
+    def background(self, filename):
+        if filename not in self._backgrounds:
+            self._backgrounds[filename] = load_background(filename)
+        return self._backgrounds[filename]
+
+    def load(self, filename, width):
+        """Same as make_grid_from_file, with a fresh grid and fresh sets"""
+        key = (filename, width)
+        if key not in self._maps:
+            rows, start, end, barrier, ztl, background = read_map(filename)
+            grid, start, end = build_grid(rows, width, start, end, barrier, ztl)
+            self._maps[key] = (grid, start, end, rows, frozenset(barrier),
+                               background, frozenset(ztl))
+        template, start, end, rows, barrier, background, ztl = self._maps[key]
+        grid = template.copy()
+        if isinstance(start, Spot):
+            start = grid[start.row][start.col]
+        if isinstance(end, Spot):
+            end = grid[end.row][end.col]
+        return grid, start, end, rows, set(barrier), self.background(background), set(ztl)
+
+
+maps = MapRepository()
 
 
 def draw_grid(win, rows, width):
@@ -275,34 +386,25 @@ def draw_bar():
     time_text = FONT1.render(f"Tempo: {elapsed_time:.0f}ms", True, (0, 0, 0))
     WIN.blit(time_text, ((WIDTH-200) + 10, 140))
 
+    if search_stats is not None:
+        count_text = FONT2.render("Generati: {}  Duplicati: {}".format(
+            search_stats.text("generated"), search_stats.text("duplicates")), True, (0, 0, 0))
+        WIN.blit(count_text, ((WIDTH-200) + 10, 168))
+        time_text = FONT2.render("Succ. {}  Euristica {}  Coda {}".format(
+            search_stats.text("successor_time"), search_stats.text("heuristic_time"),
+            search_stats.text("queue_time")), True, (0, 0, 0))
+        WIN.blit(time_text, ((WIDTH-200) + 10, 190))
 
-def draw(win, grid, rows, width, background=None):
-    win.fill(WHITE)
-    if background:
-        win.blit(background, (0, 0))
-
-    for row in grid:
-        for spot in row:
-            if not spot.is_start() and not spot.is_end():
-                spot.draw(win)
-
-    for row in grid:
-        for spot in row:
-            if spot.is_start():
-                spot.draw(win)
-            if spot.is_end():
-                spot.draw(win)
-            if spot.is_ztl():
-                spot.draw(win)
-            if spot.is_barrier():
-                spot.draw(win)
-
-    #  draw_grid(win, rows, width)
+
+def draw_panel(win, width):
+    win.fill(WHITE, (width, 0, WIDTH - width, WIDTH))
     avvia.show()
     manhattan.show()
     chebyshev.show()
     euclidean.show()
     blind.show()
+    octile.show()
+    landmarks.show()
     electric.show()
     diesel.show()
     map1.show()
@@ -313,10 +415,120 @@ def draw(win, grid, rows, width, background=None):
     astar.show()
     idastar.show()
     breathfs.show()
+    jps.show()
     all.show()
     draw_bar()
+    return pygame.Rect(width, 0, WIDTH - width, WIDTH)
+
+
+class GridRenderer:
+    """Draws a Grid repainting only the area that changed.
+
+    The cell states are mapped through PALETTE to RGBA pixels, one per
+    cell, put on a surface with surfarray and scaled up to the cell size
+    in one call, over a cached copy of the background. Each frame redraws
+    the bounding box of the cells written since the last one (plus the
+    truck and base images that moved), the button panel, and pushes just
+    those rectangles to the display. A new grid, map size or background
+    gets a full redraw.
+    """
+
+    def __init__(self):
+        self.grid = None
+        self.background = None
+        self.rows = None
+        self.width = None
+        self.base = None
+        self.sprites = set()
+
+    def _paint(self, win, rect):
+        """Redraw the cells intersecting rect and the images over them"""
+        grid, gap = self.grid, self.grid.gap
+        if gap == 0:
+            # More cells than pixels: the whole map is scaled down at once
+            self._paint_scaled(win)
+            return
+        i0, j0 = max(rect.left // gap, 0), max(rect.top // gap, 0)
+        i1 = min((rect.right - 1) // gap, grid.rows - 1)
+        j1 = min((rect.bottom - 1) // gap, grid.rows - 1)
+        win.set_clip(rect)
+        win.blit(self.base, rect.topleft, rect)
+        if i0 <= i1 and j0 <= j1:
+            colours = PALETTE[grid.state[i0:i1 + 1, j0:j1 + 1]]
+            cells = pygame.Surface(colours.shape[:2], pygame.SRCALPHA)
+            pygame.surfarray.pixels3d(cells)[...] = colours[..., :3]
+            pygame.surfarray.pixels_alpha(cells)[...] = colours[..., 3]
+            cells = pygame.transform.scale(
+                cells, ((i1 - i0 + 1) * gap, (j1 - j0 + 1) * gap))
+            win.blit(cells, (i0 * gap, j0 * gap))
+        for cell in grid.sprites:
+            if sprite_rect(cell, gap).colliderect(rect):
+                draw_sprite(win, cell, grid.state[cell], gap)
+        win.set_clip(None)
+
+    def _paint_scaled(self, win):
+        grid = self.grid
+        area = pygame.Rect(0, 0, self.width, self.width)
+        win.blit(self.base, (0, 0))
+        # One cell in k per side is shown, so the cost does not grow with the map
+        k = -(-grid.rows // self.width)
+        colours = PALETTE[grid.state[::k, ::k]]
+        cells = pygame.Surface(colours.shape[:2], pygame.SRCALPHA)
+        pygame.surfarray.pixels3d(cells)[...] = colours[..., :3]
+        pygame.surfarray.pixels_alpha(cells)[...] = colours[..., 3]
+        win.blit(pygame.transform.scale(cells, area.size), (0, 0))
+        scale = self.width / grid.rows
+        for cell in grid.sprites:
+            draw_sprite(win, cell, grid.state[cell], scale)
+
+    def redraw(self, win, grid, rows, width, background):
+        self.grid, self.rows, self.width, self.background = grid, rows, width, background
+        self.base = pygame.Surface((width, width))
+        self.base.fill(WHITE)
+        if background:
+            self.base.blit(background, (0, 0))
+        win.fill(WHITE)
+        self._paint(win, pygame.Rect(0, 0, width, width))
+        self.sprites = set(grid.sprites)
+        grid.take_dirty()
+        draw_panel(win, width)
+        pygame.display.update()
+
+    def draw(self, win, grid, rows, width, background=None):
+        if (grid is not self.grid or rows != self.rows or width != self.width or
+                background is not self.background):
+            self.redraw(win, grid, rows, width, background)
+            return
+        gap = grid.gap
+        rects = []
+        dirty = grid.take_dirty()
+        if gap == 0:
+            if dirty is not None or grid.sprites != self.sprites:
+                self._paint(win, None)
+                self.sprites = set(grid.sprites)
+                rects.append(pygame.Rect(0, 0, width, width))
+            rects.append(draw_panel(win, width))
+            pygame.display.update(rects)
+            return
+        if dirty is not None:
+            i0, j0, i1, j1 = dirty
+            rects.append(pygame.Rect(i0 * gap, j0 * gap, (i1 - i0 + 1) * gap, (j1 - j0 + 1) * gap))
+        if grid.sprites != self.sprites:
+            rects += [sprite_rect(cell, gap) for cell in grid.sprites ^ self.sprites]
+            self.sprites = set(grid.sprites)
+        area = pygame.Rect(0, 0, width, width)
+        rects = [rect.clip(area) for rect in rects]
+        for rect in rects:
+            self._paint(win, rect)
+        rects.append(draw_panel(win, width))
+        pygame.display.update(rects)
+
+
+renderer = GridRenderer()
 
-    pygame.display.update()
+
+def draw(win, grid, rows, width, background=None):
+    renderer.draw(win, grid, rows, width, background)
 
 
 def get_clicked_pos(pos, rows, width):
@@ -361,14 +573,10 @@ def mark_spots(start, grid, plan):
 
 
 def animate_truck(start, plan, grid, rows, background=None):
-    for row in grid:
-        for spot in row:
-            if spot.is_open() or spot.is_closed():
-                spot.reset()
+    grid.clear(OPEN, CLOSED)
 
     x, y = start.row, start.col
 
-    draw_grid(WIN, rows, WIDTH-200)
     draw(WIN, grid, rows, WIDTH-200, background)
 
     '''
@@ -440,12 +648,7 @@ def animate_truck(start, plan, grid, rows, background=None):
 
         grid[x][y].make_start()
 
-        if background:
-            WIN.blit(background, (0, 0))
         draw(WIN, grid, rows, WIDTH-200, background)
-        pygame.display.update()
-
-    pygame.display.update()
 
 
 def mark_expanded(exp, grid):
@@ -454,14 +657,12 @@ def mark_expanded(exp, grid):
 
 
 def save_to_file(grid, start, end, filename="temp.json"):
-    barrier = list()
-    ztl = list()
-    for x in grid:
-        for spot in x:
-            if spot.is_barrier():
-                barrier.append((spot.row, spot.col))
-            if spot.is_ztl():
-                ztl.append((spot.row, spot.col))
+    barrier = grid.cells(BARRIER)
+    ztl = grid.cells(ZTL_CELL)
+    if filename.endswith(map_format.EXTENSION):
+        world = World(len(grid) - 1, len(grid) - 1, set(barrier), set(ztl))
+        map_format.save(filename, world, (start.row, start.col), (end.row, end.col))
+        return
     res = {"rows": len(grid), "start": (start.row, start.col),
            "end": (end.row, end.col), "barrier": barrier, "ztl": ztl}
     data = json.dumps(res, indent=4)
@@ -475,27 +676,13 @@ def load_from_file(filename):
     data = json.load(f)
 
     rows = data['rows']
-    grid = []
-    gap = width // rows
 
     start = (data['start'][0], data['start'][1])
     end = (data['end'][0], data['end'][1])
 
     barrier = {(ele[0], ele[1]) for ele in data['barrier']}
 
-    for i in range(rows):
-        grid.append([])
-        for j in range(rows):
-            spot = Spot(i, j, gap)
-            if (i, j) in barrier:
-                spot.make_barrier()
-            elif (i, j) == start:
-                spot.make_start()
-                start = spot
-            elif (i, j) == end:
-                spot.make_end()
-                end = spot
-            grid[i].append(spot)
+    grid, start, end = build_grid(rows, WIDTH-200, start, end, barrier, set())
 
     return grid, start, end, rows, barrier
 
@@ -503,15 +690,99 @@ def load_from_file(filename):
 selected_heuristic = "m"
 
 
-def make_plan(p, draw, win, grid, rows, width, search_algorithm, background, he):
-    if isinstance(search_algorithm, ASTARPathFinder) or isinstance(search_algorithm, IDASTARPathFinder):
-        plan = search_algorithm.solve(p, lambda: draw(
-            win, grid, rows, width, background), grid, he, truck)
-    else:
-        plan = search_algorithm.solve(
-            p, lambda: draw(win, grid, rows, width, background), grid, truck)
+class GridObserver(SearchObserver):
+    """Shows the progress of a search on the grid"""
+
+    def __init__(self, grid):
+        self.grid = grid
+
+    def open(self, state):
+        self.grid[state[0]][state[1]].make_open()
+
+    def closed(self, state):
+        self.grid[state[0]][state[1]].make_closed()
 
-    return plan
+
+class SearchWorker(threading.Thread):
+    """Runs a search in the background, streaming its events to observer"""
+
+    def __init__(self, search_algorithm, problem, vehicle, he, observer):
+        super().__init__(daemon=True)
+        self.search_algorithm = search_algorithm
+        self.problem = problem
+        self.vehicle = vehicle
+        self.he = he
+        self.observer = observer
+        self.plan = None
+        self.elapsed = 0
+        self.error = None
+
+    def run(self):
+        # The GUI keeps one solver: the counters of the last search must
+        # not add up with this one
+        self.search_algorithm.reset_expanded()
+        now = time.perf_counter()
+        try:
+            self.plan = self.search_algorithm.solve(
+                self.problem, self.vehicle, self.he, self.observer)
+        except SearchCancelled:
+            pass
+        except Exception as e:
+            self.error = e
+        self.elapsed = time.perf_counter() - now
+        if self.search_algorithm.stats is not None:
+            self.search_algorithm.stats.elapsed = self.elapsed
+        self.observer.flush()
+
+
+# Plans already found, so AVVIA on a query solved before skips the search
+routes = RouteCache()
+
+
+def make_plan(p, draw, win, grid, rows, width, search_algorithm, background, he):
+    """Run the search in a worker thread, showing its progress at FPS.
+
+    The window keeps handling QUIT and ESC, which cancel the search
+    (SearchCancelled is raised). Returns the plan and the time the search
+    took.
+    """
+    observer = QueueObserver()
+    worker = SearchWorker(search_algorithm, p, Vehicle(truck.type), he, observer)
+    grid_observer = GridObserver(grid)
+    quit_event = None
+    worker.start()
+    while worker.is_alive():
+        for event in pygame.event.get((pygame.QUIT, pygame.KEYDOWN)):
+            if event.type == pygame.QUIT:
+                observer.cancel()
+                quit_event = event
+            elif event.key == pygame.K_ESCAPE:
+                observer.cancel()
+        observer.drain(grid_observer)
+        draw(win, grid, rows, width, background)
+        clock.tick(FPS)
+    worker.join()
+    observer.drain(grid_observer)
+    draw(win, grid, rows, width, background)
+    if worker.error is not None:
+        raise worker.error
+    if observer.cancelled:
+        if quit_event is not None:
+            # Let the main loop close the window
+            pygame.event.post(quit_event)
+        raise SearchCancelled()
+    return worker.plan, worker.elapsed
+
+
+def do_all_configurations():
+    """(algorithm, heuristic, truck type) of every run of DO ALL"""
+    configurations = []
+    for tru in ["diesel", "electric"]:
+        for he in ["m", "c", "e", "o", "a", "b"]:
+            for alg in ["ASTAR", "IDASTAR", "JPS"]:
+                configurations.append((alg, he, tru))
+        configurations.append(("BRFS", "b", tru))
+    return configurations
 
 
 def choose_plan(plans):
@@ -519,7 +790,7 @@ def choose_plan(plans):
     min_plan = None
     min_type = None
     for plan, ty in plans:
-        if len(plan) < min:
+        if plan is not None and len(plan) < min:
             min = len(plan)
             min_plan = plan
             min_type = ty
@@ -529,33 +800,13 @@ def choose_plan(plans):
 def update_selected_heuristic(event, search_algorithm):
     global selected_heuristic
 
-    heuristic_selected = manhattan.click(event, search_algorithm, "m")
-    if heuristic_selected:
-        selected_heuristic = heuristic_selected
-        chebyshev.change_text("chebyshev", bg="navy")
-        euclidean.change_text("eucledian", bg="navy")
-        blind.change_text("blind", bg="navy")
-
-    heuristic_selected = chebyshev.click(event, search_algorithm, "c")
-    if heuristic_selected:
-        selected_heuristic = heuristic_selected
-        manhattan.change_text("manhattan", bg="navy")
-        euclidean.change_text("eucledian", bg="navy")
-        blind.change_text("blind", bg="navy")
-
-    heuristic_selected = euclidean.click(event, search_algorithm, "e")
-    if heuristic_selected:
-        selected_heuristic = heuristic_selected
-        manhattan.change_text("manhattan", bg="navy")
-        chebyshev.change_text("chebyshev", bg="navy")
-        blind.change_text("blind", bg="navy")
-
-    heuristic_selected = blind.click(event, search_algorithm, "b")
-    if heuristic_selected:
-        selected_heuristic = heuristic_selected
-        manhattan.change_text("manhattan", bg="navy")
-        chebyshev.change_text("chebyshev", bg="navy")
-        euclidean.change_text("eucledian", bg="navy")
+    for button, he in heuristic_buttons:
+        heuristic_selected = button.click(event, search_algorithm, he)
+        if heuristic_selected:
+            selected_heuristic = heuristic_selected
+            for other, _ in heuristic_buttons:
+                if other is not button:
+                    other.change_text(other.name, bg="navy")
 
 
 class Button:
@@ -639,35 +890,35 @@ class Button:
                         map3.change_text("map 3", bg="navy")
                         map4.change_text("map 4", bg="navy")
                         map5.change_text("map 5", bg="navy")
-                        return make_grid_from_file("maps/mappa-città.json", WIDTH-200)
+                        return maps.load("maps/mappa-città.json", WIDTH-200)
                     elif self.name == "map 2":
                         self.change_text(self.feedback, bg="purple")
                         map1.change_text("map 1", bg="navy")
                         map3.change_text("map 3", bg="navy")
                         map4.change_text("map 4", bg="navy")
                         map5.change_text("map 5", bg="navy")
-                        return make_grid_from_file("maps/mappa-grande-2.json", WIDTH-200)
+                        return maps.load("maps/mappa-grande-2.json", WIDTH-200)
                     elif self.name == "map 3":
                         self.change_text(self.feedback, bg="purple")
                         map1.change_text("map 1", bg="navy")
                         map2.change_text("map 2", bg="navy")
                         map4.change_text("map 4", bg="navy")
                         map5.change_text("map 5", bg="navy")
-                        return make_grid_from_file("maps/mappa-grande-3.json", WIDTH-200)
+                        return maps.load("maps/mappa-grande-3.json", WIDTH-200)
                     elif self.name == "map 4":
                         self.change_text(self.feedback, bg="purple")
                         map1.change_text("map 1", bg="navy")
                         map2.change_text("map 2", bg="navy")
                         map3.change_text("map 3", bg="navy")
                         map5.change_text("map 5", bg="navy")
-                        return make_grid_from_file("maps/mappa-grande-4.json", WIDTH-200)
+                        return maps.load("maps/mappa-grande-4.json", WIDTH-200)
                     elif self.name == "map 5":
                         self.change_text(self.feedback, bg="purple")
                         map1.change_text("map 1", bg="navy")
                         map2.change_text("map 2", bg="navy")
                         map3.change_text("map 3", bg="navy")
                         map4.change_text("map 4", bg="navy")
-                        return make_grid_from_file("maps/mappa-grande-5.json", WIDTH-200)
+                        return maps.load("maps/mappa-grande-5.json", WIDTH-200)
 
     def click_algorithm(self, event):
         x, y = pygame.mouse.get_pos()
@@ -678,59 +929,78 @@ class Button:
                         self.change_text(self.feedback, bg="orange")
                         idastar.change_text("IDA*", bg="navy")
                         breathfs.change_text("BRFS", bg="navy")
+                        jps.change_text("JPS", bg="navy")
                         return ASTARPathFinder(heuristics.manhattan, True)
                     elif self.name == "IDA*":
                         self.change_text(self.feedback, bg="orange")
                         astar.change_text("A*", bg="navy")
                         breathfs.change_text("BRFS", bg="navy")
+                        jps.change_text("JPS", bg="navy")
                         return IDASTARPathFinder(True)
                     elif self.name == "BRFS":
                         self.change_text(self.feedback, bg="orange")
                         astar.change_text("A*", bg="navy")
                         idastar.change_text("IDA*", bg="navy")
+                        jps.change_text("JPS", bg="navy")
                         return BRFSPathFinder(True)
+                    elif self.name == "JPS":
+                        self.change_text(self.feedback, bg="orange")
+                        astar.change_text("A*", bg="navy")
+                        idastar.change_text("IDA*", bg="navy")
+                        breathfs.change_text("BRFS", bg="navy")
+                        return JPSPathFinder(True)
 
     def click_all(self, event, start, end, world, draw, win, grid, rows, width, background):
-        global total_cost, expanded_nodes, elapsed_time
+        global total_cost, expanded_nodes, elapsed_time, search_stats
         x, y = pygame.mouse.get_pos()
         if event.type == pygame.MOUSEBUTTONDOWN:
             if pygame.mouse.get_pressed()[0]:
                 if self.rect.collidepoint(x, y):
+                    if start is None or end is None:
+                        return None
                     self.change_text(self.feedback, bg="brown")
-                    heurs = ["m", "c", "e", "b"]
-                    trucks = ["diesel", "electric"]
-                    algorithms = [ASTARPathFinder(
-                        heuristics.manhattan, True), IDASTARPathFinder(True)]
-                    p = PathFinding((start.row, start.col),
-                                    (end.row, end.col), world)
+                    configurations = do_all_configurations()
                     plans = []
-                    for tru in trucks:
-                        truck.type = tru
-                        for he in heurs:
-                            selected_heuristic = he
-                            for alg in algorithms:
-                                now = time.time()
-                                plan = make_plan(p, draw, win, grid, rows,
-                                                 width, alg, background, selected_heuristic), truck.type
-                                now = time.time() - now
-                                plans.append(plan)
-                                print(plan)
-                                total_cost = len(plan[0])
-                                expanded_nodes = alg.expanded
-                                elapsed_time = now*1000
-                        last_alg = BRFSPathFinder(True)
-                        now = time.time()
-                        last = make_plan(p, draw, win, grid, rows,
-                                         width, last_alg, background, selected_heuristic), truck.type
-                        now = time.time() - now
-                        plans.append(last)
-                        print(last)
-                        total_cost = len(last[0])
-                        expanded_nodes = last_alg.expanded
-                        elapsed_time = now*1000
-                    best, truck.type = choose_plan(plans)
-                    mark_spots(start, grid, best)
-                    animate_truck(start, best, grid, rows, background)
+                    # Every configuration is solved headless in a worker
+                    # process while the window keeps drawing the progress
+                    with batch.process_pool() as pool:
+                        futures = [pool.submit(batch.solve_query, world, (start.row, start.col),
+                                               (end.row, end.col), tru, alg, he)
+                                   for alg, he, tru in configurations]
+                        pending = list(futures)
+                        while pending:
+                            for e in pygame.event.get(pygame.QUIT):
+                                # Leaving the with block would wait for
+                                # every queued configuration
+                                pool.shutdown(wait=False, cancel_futures=True)
+                                pygame.event.post(e)
+                                self.change_text("DO ALL", bg="navy")
+                                return None
+                            for future in [f for f in pending if f.done()]:
+                                pending.remove(future)
+                                result = future.result()
+                                print(result)
+                                if result.plan is not None:
+                                    total_cost = result.cost
+                                expanded_nodes = result.expanded
+                                elapsed_time = result.elapsed*1000
+                                search_stats = result.stats
+                            self.change_text("DO ALL {}/{}".format(
+                                len(futures) - len(pending), len(futures)), bg="brown")
+                            draw(win, grid, rows, width, background)
+                            clock.tick(FPS)
+                    for future in futures:
+                        result = future.result()
+                        plans.append((result.plan, result.vehicle_type))
+                    best, best_type = choose_plan(plans)
+                    if best is not None:
+                        # Animate the winner with its own truck, then give
+                        # back the truck selected with the buttons
+                        selected_type = truck.type
+                        truck.type = best_type
+                        mark_spots(start, grid, best)
+                        animate_truck(start, best, grid, rows, background)
+                        truck.type = selected_type
                     self.change_text("DO ALL", bg="navy")
                     return plans
 
@@ -791,73 +1061,101 @@ breathfs = Button(
     bg="navy",
     feedback="BRFS")
 
+jps = Button(
+    "JPS",
+    ((WIDTH-200)+20, 480),
+    font=30,
+    bg="navy",
+    feedback="JPS")
+
 manhattan = Button(
     "manhattan",
-    ((WIDTH-200)+20, 500),
+    ((WIDTH-200)+20, 530),
     font=30,
     bg="navy",
     feedback="manhattan")
 
 chebyshev = Button(
     "chebyshev",
-    ((WIDTH-200)+20, 530),
+    ((WIDTH-200)+20, 560),
     font=30,
     bg="navy",
     feedback="chebyshev")
 
 euclidean = Button(
     "eucledian",
-    ((WIDTH-200)+20, 560),
+    ((WIDTH-200)+20, 590),
     font=30,
     bg="navy",
     feedback="eucledian")
 
 blind = Button(
     "blind",
-    ((WIDTH-200)+20, 590),
+    ((WIDTH-200)+20, 620),
     font=30,
     bg="navy",
     feedback="blind")
 
+octile = Button(
+    "octile",
+    ((WIDTH-200)+20, 650),
+    font=30,
+    bg="navy",
+    feedback="octile")
+
+landmarks = Button(
+    "landmarks",
+    ((WIDTH-200)+20, 680),
+    font=30,
+    bg="navy",
+    feedback="landmarks")
+
+heuristic_buttons = [(manhattan, "m"), (chebyshev, "c"), (euclidean, "e"),
+                     (blind, "b"), (octile, "o"), (landmarks, "a")]
+
 electric = Button(
     "electric",
-    ((WIDTH-200)+20, 640),
+    ((WIDTH-200)+20, 730),
     font=30,
     bg="navy",
     feedback="electric")
 
 diesel = Button(
     "diesel",
-    ((WIDTH-200)+20, 670),
+    ((WIDTH-200)+20, 760),
     font=30,
     bg="navy",
     feedback="diesel")
 
 all = Button(
     "DO ALL",
-    ((WIDTH-200)+20, 720),
+    ((WIDTH-200)+20, 810),
     font=30,
     bg="navy",
     feedback="DO ALL")
 
 avvia = Button(
     "AVVIA",
-    ((WIDTH-200)+20, 770),
+    ((WIDTH-200)+20, 860),
     font=30,
     bg="navy",
     feedback="AVVIA")
 
 
 clock = pygame.time.Clock()
+# Frames per second while a search or DO ALL runs
+FPS = 30
 
 
 @click.command()
 @click.option('-w', '--width', default=WIDTH-200, help="Width of the Windows")
 @click.option('-r', '--rows', default=50, help="Number of rows/columns in the map")
-@click.option('-s', '--search_algorithm', default="ASTAR", help="Search algorithm to be used")
+@click.option('-s', '--search_algorithm', default="ASTAR", help="Search algorithm to be used (ASTAR, IDASTAR, BRFS, JPS, DSTARLITE or HPASTAR)")
 @click.option('-f', '--filename', default=None, help="Initialize map with data from file")
-def main(width, rows, search_algorithm, filename=None):
-    global total_cost, expanded_nodes, elapsed_time
+@click.option('--no-stats', is_flag=True, help="Do not collect the search statistics")
+def main(width, rows, search_algorithm, filename=None, no_stats=False):
+    global total_cost, expanded_nodes, elapsed_time, search_stats
+    SearchAlgorithm.collect_stats = not no_stats
     win = WIN
     start = None
     end = None
@@ -870,9 +1168,16 @@ def main(width, rows, search_algorithm, filename=None):
         search_algorithm = BRFSPathFinder(True)
     elif search_algorithm == 'IDASTAR':
         search_algorithm = IDASTARPathFinder(True)
+    elif search_algorithm == 'JPS':
+        search_algorithm = JPSPathFinder(True)
+    elif search_algorithm == 'DSTARLITE':
+        # Replans incrementally when barriers are painted or erased
+        search_algorithm = DSTARLITEPathFinder(True)
+    elif search_algorithm == 'HPASTAR':
+        search_algorithm = HPASTARPathFinder(True)
     if filename is not None:
 
-        grid, start, end, rows, wall, background = make_grid_from_file(
+        grid, start, end, rows, wall, background, ztl = make_grid_from_file(
             filename, width)
 
         for i in list(wall):
@@ -880,40 +1185,31 @@ def main(width, rows, search_algorithm, filename=None):
     else:
         grid = make_grid(rows, width)
         wall = set()
+    world = World(rows-1, rows-1, wall, ztl)
     run = True
 
     while run:
         draw(win, grid, rows, width, background)
 
         for event in pygame.event.get():
-            pygame.display.update()
             if event.type == pygame.QUIT:
                 run = False
             update_selected_heuristic(event, search_algorithm)
             electric.click_truck(event, truck)
             diesel.click_truck(event, truck)
-            if map1.click_map(event) is not None:
-                grid, start, end, rows, wall, background, ztl = map1.click_map(
-                    event)
-            if map2.click_map(event) is not None:
-                grid, start, end, rows, wall, background, ztl = map2.click_map(
-                    event)
-            if map3.click_map(event) is not None:
-                grid, start, end, rows, wall, background, ztl = map3.click_map(
-                    event)
-            if map4.click_map(event) is not None:
-                grid, start, end, rows, wall, background, ztl = map4.click_map(
-                    event)
-            if map5.click_map(event) is not None:
-                grid, start, end, rows, wall, background, ztl = map5.click_map(
-                    event)
+            for map_button in (map1, map2, map3, map4, map5):
+                loaded = map_button.click_map(event)
+                if loaded is not None:
+                    grid, start, end, rows, wall, background, ztl = loaded
+                    world = World(rows-1, rows-1, wall, ztl)
             if astar.click_algorithm(event) is not None:
                 search_algorithm = astar.click_algorithm(event)
             if idastar.click_algorithm(event) is not None:
                 search_algorithm = idastar.click_algorithm(event)
             if breathfs.click_algorithm(event) is not None:
                 search_algorithm = breathfs.click_algorithm(event)
-            world = World(rows-1, rows-1, wall, ztl)
+            if jps.click_algorithm(event) is not None:
+                search_algorithm = jps.click_algorithm(event)
             all.click_all(event, start, end, world,
                           draw, win, grid, rows, width, background)
 
@@ -932,7 +1228,7 @@ def main(width, rows, search_algorithm, filename=None):
 
                     elif spot != end and spot != start:
                         spot.make_barrier()
-                        wall.add((row, col))
+                        world.add_wall((row, col))
                         # spot.make_ztl()
                         #  ztl.add((row, col))
 
@@ -946,25 +1242,40 @@ def main(width, rows, search_algorithm, filename=None):
                         start = None
                     elif spot == end:
                         end = None
-                    elif spot.is_barrier():
-                        wall.remove((row, col))
+                    elif (row, col) in world.walls:
+                        world.remove_wall((row, col))
 
             if avvia.click_avvia(event) or event.type == pygame.KEYDOWN:
                 if avvia.click_avvia(event) or event.key == pygame.K_SPACE and start and end:
-                    world = World(rows-1, rows-1, wall, ztl)
                     p = PathFinding((start.row, start.col),
                                     (end.row, end.col), world)
-                    now = time.time()
-                    plan = make_plan(p, draw, win, grid, rows,
-                                     width, search_algorithm, background, selected_heuristic)
-                    now = time.time() - now
-                    print("Number of Expansion: {} in {} seconds".format(
-                        search_algorithm.expanded, now))
+                    he = selected_heuristic if search_algorithm.uses_heuristic else "-"
+                    key = RouteCache.key(world, p.init, p.goal, truck.type,
+                                         solver.algorithm_name(search_algorithm) or
+                                         type(search_algorithm).__name__, he)
+                    result = routes.get(key)
+                    if result is None:
+                        try:
+                            plan, now = make_plan(p, draw, win, grid, rows, width,
+                                                  search_algorithm, background, selected_heuristic)
+                        except SearchCancelled:
+                            print("Search cancelled")
+                            continue
+                        result = solver.Result(plan, search_algorithm.expanded, now, key[4],
+                                               he, truck.type, search_algorithm.max_frontier,
+                                               search_algorithm.stats)
+                        routes.put(key, result)
+                    plan = result.plan
+                    print("Number of Expansion: {} in {} seconds{}".format(
+                        result.expanded, result.elapsed, " (cached)" if result.cached else ""))
                     if plan is not None:
                         print(plan)
                         total_cost = len(plan)
-                        expanded_nodes = search_algorithm.expanded
-                        elapsed_time = now*1000
+                        expanded_nodes = result.expanded
+                        elapsed_time = result.elapsed*1000
+                        search_stats = result.stats
+                        if search_stats is not None:
+                            print(search_stats.to_json())
                         print("Cost of the plan is: {}".format(len(plan)))
                         mark_spots(start, grid, plan)
                         animate_truck(start, plan, grid, rows, background)
@@ -975,6 +1286,7 @@ def main(width, rows, search_algorithm, filename=None):
                     end = None
                     grid = make_grid(rows, width)
                     wall = set()
+                    world = World(rows-1, rows-1, wall, ztl)
 
     pygame.quit()
 
@@ -0,0 +1,77 @@
+import copy
+import hashlib
+import os
+import pickle
+import solver
+from cache import LRUCache
+
+
+class RouteCache(object):
+    """Results of solved queries, so a repeated query skips the search.
+
+    Entries are keyed by (world.content_hash(), start, goal, vehicle type,
+    algorithm, heuristic): any wall or ZTL edit changes the hash, so the
+    results computed on the old map are never returned for the new one
+    (they become valid again if the edit is undone). The results keep the
+    expansions and time of the original search and come back with
+    cached = True.
+
+    With a directory the cache has a second tier on disk, one pickle per
+    entry, that survives between runs.
+    """
+
+    def __init__(self, maxsize=256, directory=None):
+        self.memory = LRUCache(maxsize)
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(world, start, goal, vehicle_type, algorithm, heuristic):
+        return (world.content_hash(), tuple(start), tuple(goal), vehicle_type,
+                algorithm.upper(), heuristic)
+
+    def _path(self, key):
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, name + ".pickle")
+
+    def get(self, key):
+        result = self.memory.get(key)
+        if result is None and self.directory is not None:
+            try:
+                with open(self._path(key), "rb") as f:
+                    result = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                return None
+            self.memory.put(key, result)
+        if result is None:
+            return None
+        result = copy.copy(result)
+        result.cached = True
+        return result
+
+    def put(self, key, result):
+        self.memory.put(key, result)
+        if self.directory is not None:
+            path = self._path(key)
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump(result, f)
+            os.replace(path + ".tmp", path)
+
+    def solve(self, problem, vehicle, algorithm="ASTAR", heuristic="m", observer=None):
+        """solver.solve, answered from the cache when possible"""
+        vehicle_type = vehicle if isinstance(vehicle, str) else vehicle.type
+        key = self.key(problem.world, problem.init, problem.goal, vehicle_type,
+                       algorithm, heuristic)
+        result = self.get(key)
+        if result is None:
+            result = solver.solve(problem, vehicle, algorithm, heuristic, observer)
+            self.put(key, result)
+        return result
+
+    def clear(self):
+        self.memory.clear()
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith(".pickle"):
+                    os.remove(os.path.join(self.directory, name))
@@ -1,19 +1,249 @@
+import json
+import math
+import queue
+import threading
+import time
+from array import array
 import search_problem as SearchProblem
 
 
-class Node:
-    def __init__(self, state, parent=None, action=None, g=0) -> None:
-        self.state = state
-        self.parent = parent
-        self.action = action
-        self.g = g
+class SearchMemory:
+    """What a search knows about every cell, in flat typed arrays.
+
+    States are flat indices of the World occupancy grid. For each cell
+    parent holds the index it was reached from (-1 if none), action the
+    position in actions of the move that reached it and g its cost, all
+    preallocated for the whole grid, so a search allocates no object per
+    state and plan() rebuilds the plan in time linear in its length.
+    """
+
+    def __init__(self, size, actions):
+        self.actions = actions
+        self.parent = array('i', [-1]) * size
+        self.action = array('B', [0]) * size
+        self.g = array('d', [math.inf]) * size
+
+    def plan(self, index):
+        """Actions from the cell with no parent (the start) to index"""
+        parent, action, actions = self.parent, self.action, self.actions
+        plan = []
+        while parent[index] >= 0:
+            plan.append(actions[action[index]])
+            index = parent[index]
+        plan.reverse()
+        return plan
+
+
+class SearchObserver:
+    """Receives the events of a running search.
+
+    Solvers run headless when no observer is given; the GUI subscribes with
+    an observer that colours the grid and redraws the window.
+    """
+
+    def open(self, state):
+        pass
+
+    def closed(self, state):
+        pass
+
+    def step(self):
+        pass
+
+
+class SearchCancelled(Exception):
+    """Raised inside a search whose QueueObserver was cancelled"""
+
+
+class QueueObserver(SearchObserver):
+    """Streams the events of a search running in another thread.
+
+    The open and closed events are collected and put on the events queue
+    in batches, one every batch steps, so the consumer can apply them at
+    its own pace with drain. cancel() stops the search at its next step,
+    where SearchCancelled is raised.
+    """
+
+    def __init__(self, batch=64):
+        self.events = queue.Queue()
+        self.batch = batch
+        self._pending = []
+        self._steps = 0
+        self._cancelled = threading.Event()
+
+    def open(self, state):
+        self._pending.append(("open", state))
+
+    def closed(self, state):
+        self._pending.append(("closed", state))
+
+    def step(self):
+        if self._cancelled.is_set():
+            raise SearchCancelled()
+        self._steps += 1
+        if self._steps >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self.events.put(self._pending)
+            self._pending = []
+        self._steps = 0
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def drain(self, observer):
+        """Replay on observer the events received so far"""
+        while True:
+            try:
+                events = self.events.get_nowait()
+            except queue.Empty:
+                return
+            for kind, state in events:
+                if kind == "open":
+                    observer.open(state)
+                else:
+                    observer.closed(state)
+
+
+class SearchStats:
+    """Counters and timings of one search.
+
+    Solvers fill these in only when collect_stats is on: they then wrap
+    their hot calls with timed and counted, so with the flag off the
+    search runs exactly the code it runs without statistics. Times are in
+    seconds; successor_time, heuristic_time and queue_time are the time
+    spent generating successors, computing the heuristic and in the open
+    list (or the IDA* stack). A field a solver cannot measure is None.
+    """
+
+    FIELDS = ["algorithm", "generated", "expanded", "reexpanded", "duplicates",
+              "max_frontier", "heuristic_evaluations", "iterations",
+              "successor_time", "heuristic_time", "queue_time", "elapsed"]
+
+    def __init__(self, algorithm=""):
+        self.algorithm = algorithm
+        self.generated = 0
+        self.expanded = 0
+        self.reexpanded = 0
+        self.duplicates = 0
+        self.max_frontier = 0
+        self.heuristic_evaluations = 0
+        self.iterations = 0
+        self.successor_time = 0.0
+        self.heuristic_time = 0.0
+        self.queue_time = 0.0
+        self.elapsed = 0.0
+        self._expanded_states = set()
+
+    def unmeasured(self, *fields):
+        for field in fields:
+            setattr(self, field, None)
+
+    def expand(self, state):
+        self.expanded += 1
+        if state in self._expanded_states:
+            self.reexpanded += 1
+        else:
+            self._expanded_states.add(state)
+
+    def timed(self, function, field):
+        """function, adding the time spent in it to field"""
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            now = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                setattr(self, field, getattr(self, field) + clock() - now)
+        return wrapper
+
+    def successors(self, function):
+        """A successor function timed into successor_time, counting generated.
+
+        function returns the successors as a sequence, or as a pair of
+        sequences (NeighbourTable.neighbours) whose first one is counted.
+        """
+        clock = time.perf_counter
+
+        def wrapper(*args):
+            now = clock()
+            result = function(*args)
+            self.successor_time += clock() - now
+            self.generated += len(result[0] if isinstance(result, tuple) else result)
+            return result
+        return wrapper
+
+    def counted(self, table):
+        """A heuristic table whose lookups count as heuristic_evaluations"""
+        return _CountedTable(table, self)
+
+    def __getstate__(self):
+        # The expanded states are only needed while the search runs
+        state = dict(self.__dict__)
+        state["_expanded_states"] = set()
+        return state
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def text(self, field):
+        """A field for display, times in milliseconds, "-" if unmeasured"""
+        value = getattr(self, field)
+        if value is None:
+            return "-"
+        if field.endswith("_time") or field == "elapsed":
+            return "{:.1f}ms".format(value * 1000)
+        return str(value)
+
+    def __str__(self):
+        return ("{} expanded ({} again), {} generated, {} duplicates, {} heuristic "
+                "evaluations; successors {}, heuristic {}, queue {}").format(
+            *(self.text(field) for field in (
+                "expanded", "reexpanded", "generated", "duplicates", "heuristic_evaluations",
+                "successor_time", "heuristic_time", "queue_time")))
+
+
+class _CountedTable:
+    def __init__(self, table, stats):
+        self.table = table
+        self.stats = stats
+
+    def __getitem__(self, index):
+        stats = self.stats
+        now = time.perf_counter()
+        value = self.table[index]
+        stats.heuristic_time += time.perf_counter() - now
+        stats.heuristic_evaluations += 1
+        return value
 
 
 class SearchAlgorithm:
+    # False for blind solvers, which ignore the heuristic passed to solve
+    uses_heuristic = True
+    # Fill in a SearchStats at every solve (stats); off, it costs nothing
+    collect_stats = False
+
     def __init__(self, view=False) -> None:
         self.expanded = 0
+        self.max_frontier = 0
         self.expanded_states = set()
         self.view = view
+        self.stats = None
+
+    def start_stats(self):
+        """A new SearchStats for this search, None if collect_stats is off"""
+        self.stats = SearchStats(type(self).__name__) if self.collect_stats else None
+        return self.stats
 
     def is_expanded(self, state):
         if state in self.expanded_states:
@@ -21,22 +251,24 @@ class SearchAlgorithm:
         else:
             return False
 
-    def solve(self, problem: SearchProblem) -> list:
+    def solve(self, problem: SearchProblem, truck, he="m", observer=None) -> list:
         raise Exception("Not implemented")
 
     def update_expanded(self, state):
         if (self.view):
             self.expanded_states.add(state)
         self.expanded += 1
+        if self.stats is not None:
+            self.stats.expand(state)
+
+    def update_frontier(self, size):
+        if size > self.max_frontier:
+            self.max_frontier = size
+        if self.stats is not None and size > self.stats.max_frontier:
+            self.stats.max_frontier = size
 
     def reset_expanded(self):
         if (self.view):
             self.expanded_states = set()
         self.expanded = 0
-
-    def extract_solution(self, node) -> list:
-        sol = list()
-        while (node.parent is not None):
-            sol.insert(0, node.action)
-            node = node.parent
-        return sol
+        self.max_frontier = 0
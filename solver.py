@@ -0,0 +1,99 @@
+import importlib
+import time
+from vehicle import Vehicle
+
+# Solver classes by the names accepted on the command line (-s option), as
+# (module, class): a solver module is only imported once it is used
+ALGORITHMS = {
+    "ASTAR": ("ASTAR", "AStar"),
+    "IDASTAR": ("IDASTAR", "IDAStar"),
+    "BRFS": ("BRFS", "BrFS"),
+    "JPS": ("JPS", "JPS"),
+    "BIASTAR": ("BIDIRECTIONAL", "BiAStar"),
+    "BIBRFS": ("BIDIRECTIONAL", "BiBrFS"),
+    "FIELD": ("distance_field", "DistanceField"),
+    "DSTARLITE": ("DSTARLITE", "DStarLite"),
+    "HPASTAR": ("HPASTAR", "HPAStar"),
+}
+
+
+class Result(object):
+    """Outcome of a headless search: the plan plus what it cost to find it."""
+
+    def __init__(self, plan, expanded, elapsed, algorithm, heuristic, vehicle_type, max_frontier=0,
+                 stats=None):
+        self.plan = plan
+        # True when the result comes from a RouteCache instead of a search
+        self.cached = False
+        self.expanded = expanded
+        self.max_frontier = max_frontier
+        self.elapsed = elapsed
+        self.algorithm = algorithm
+        self.heuristic = heuristic
+        self.vehicle_type = vehicle_type
+        # The SearchStats of the search, if it collected them
+        self.stats = stats
+
+    @property
+    def cost(self):
+        return len(self.plan) if self.plan is not None else None
+
+    @property
+    def solved(self):
+        return self.plan is not None
+
+    def to_dict(self):
+        return {"algorithm": self.algorithm, "heuristic": self.heuristic,
+                "vehicle": self.vehicle_type, "solved": self.solved, "cost": self.cost,
+                "expanded": self.expanded, "max_frontier": self.max_frontier,
+                "elapsed": self.elapsed, "cached": self.cached, "plan": self.plan,
+                "stats": self.stats.to_dict() if self.stats is not None else None}
+
+    def __str__(self):
+        return "{} ({}, {}): cost {}, {} expanded in {:.1f}ms".format(
+            self.algorithm, self.heuristic, self.vehicle_type, self.cost,
+            self.expanded, self.elapsed * 1000)
+
+
+def algorithm_name(search_algorithm):
+    """The ALGORITHMS name of a solver instance, None if not registered"""
+    cls = type(search_algorithm)
+    for name, (module, class_name) in ALGORITHMS.items():
+        if cls.__module__ == module and cls.__name__ == class_name:
+            return name
+    return None
+
+
+def solver_class(algorithm):
+    try:
+        module, class_name = ALGORITHMS[algorithm.upper()]
+    except KeyError:
+        raise ValueError("Unknown search algorithm: {}".format(algorithm))
+    return getattr(importlib.import_module(module), class_name)
+
+
+def make_solver(algorithm):
+    return solver_class(algorithm)()
+
+
+def solve(problem, vehicle, algorithm="ASTAR", heuristic="m", observer=None, stats=None) -> Result:
+    """Solve a PathFinding problem without any rendering.
+
+    vehicle is a Vehicle (or anything with a type attribute) or just the
+    vehicle type string. The observer, if given, receives the search events.
+    stats turns the SearchStats of the search on or off; None leaves it to
+    SearchAlgorithm.collect_stats.
+    """
+    if isinstance(vehicle, str):
+        vehicle = Vehicle(vehicle)
+    search_algorithm = make_solver(algorithm)
+    if stats is not None:
+        search_algorithm.collect_stats = stats
+    now = time.perf_counter()
+    plan = search_algorithm.solve(problem, vehicle, heuristic, observer)
+    elapsed = time.perf_counter() - now
+    if search_algorithm.stats is not None:
+        search_algorithm.stats.elapsed = elapsed
+    return Result(plan, search_algorithm.expanded, elapsed,
+                  algorithm.upper(), heuristic, vehicle.type,
+                  search_algorithm.max_frontier, search_algorithm.stats)
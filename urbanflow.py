@@ -0,0 +1,93 @@
+import argparse
+import json
+import sys
+import solver
+from heuristics import HEURISTICS
+from vehicle import VEHICLES
+
+# The headless command line, for scripts and batch jobs:
+#   python -m urbanflow solve --map maps/mappa-grande-4.json --algo astar --vehicle diesel
+# Nothing here imports pygame or click, and only the solver module of the
+# chosen algorithm is imported, so the command starts fast.
+
+
+def cell(text):
+    try:
+        x, y = (int(v) for v in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected a cell as x,y, not {!r}".format(text))
+    return x, y
+
+
+def heuristic(text):
+    return HEURISTICS.get(text, text)
+
+
+def solve(parser, args):
+    from path_finding import PathFinding
+    from world import load_map
+    world, start, goal = load_map(args.map)
+    start = args.start or start
+    goal = args.goal or goal
+    for name, state in (("start", start), ("goal", goal)):
+        if not (0 <= state[0] <= world.x_lim and 0 <= state[1] <= world.y_lim):
+            parser.error("the {} {} is outside the map".format(name, state))
+    result = solver.solve(PathFinding(start, goal, world), args.vehicle, args.algo,
+                          args.heuristic, stats=not args.no_stats)
+    if args.json:
+        data = {"map": args.map, "start": start, "goal": goal}
+        data.update(result.to_dict())
+        print(json.dumps(data))
+    else:
+        print(result)
+        print("Plan: {}".format(" ".join(result.plan) if result.solved else "none"))
+        if result.stats is not None:
+            print("Stats: {}".format(result.stats))
+    return 0 if result.solved else 1
+
+
+def convert(parser, args):
+    import map_format
+    try:
+        map_format.convert(args.source, args.target)
+    except ValueError as e:
+        parser.error(str(e))
+    return 0
+
+
+def main(argv=None):
+    """Run a command; the exit status of solve is 1 when there is no plan"""
+    parser = argparse.ArgumentParser(prog="urbanflow", description="UrbanFlow without the GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    solve_parser = commands.add_parser("solve", help="Find a plan on a map and print it")
+    solve_parser.add_argument("-m", "--map", required=True, help="Map file (.json or .umap)")
+    solve_parser.add_argument("-a", "--algo", type=str.upper, default="ASTAR",
+                              choices=list(solver.ALGORITHMS), help="Search algorithm")
+    solve_parser.add_argument("-e", "--heuristic", type=heuristic, default="m",
+                              choices=list(HEURISTICS.values()),
+                              help="Heuristic, by name or letter (default manhattan)")
+    solve_parser.add_argument("-v", "--vehicle", default="electric", choices=VEHICLES,
+                              help="Vehicle type")
+    solve_parser.add_argument("--start", type=cell, default=None,
+                              help="Start cell as x,y (default: the start of the map)")
+    solve_parser.add_argument("--goal", type=cell, default=None,
+                              help="Goal cell as x,y (default: the end of the map)")
+    solve_parser.add_argument("--json", action="store_true",
+                              help="Print the result as one JSON object")
+    solve_parser.add_argument("--no-stats", action="store_true",
+                              help="Do not collect the search statistics")
+    solve_parser.set_defaults(run=solve)
+
+    convert_parser = commands.add_parser(
+        "convert", help="Convert a map between the JSON and the binary (.umap) format")
+    convert_parser.add_argument("source", help="Map to read")
+    convert_parser.add_argument("target", help="Map to write, in the other format")
+    convert_parser.set_defaults(run=convert)
+
+    args = parser.parse_args(argv)
+    return args.run(parser, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+# The vehicle profiles, see World.blocked
+VEHICLES = ["electric", "diesel"]
+
+
+class Vehicle(object):
+    """A vehicle profile as seen by the search problems.
+
+    Only the type matters to the solvers: diesel vehicles cannot enter the
+    ZTL cells of a World, electric ones can.
+    """
+
+    def __init__(self, vehicle_type="electric"):
+        self.type = vehicle_type
+
+    def __str__(self):
+        return self.type
@@ -1,9 +1,212 @@
+import hashlib
+import json
+import weakref
+import numpy as np
+from neighbour_table import NeighbourTable
+
+# Cell flags of the occupancy grid
+FREE = 0
+WALL = 1
+ZTL = 2
+
+
 class World(object):
+    """The map: limits, walls and ZTL cells.
+
+    Besides the walls and ztl sets the World offers an occupancy grid, a
+    uint8 matrix of cell flags built once on first use. The grid has a
+    one cell border of walls around the map, so cell (x, y) is stored at
+    [x + 1, y + 1] and a neighbour lookup never needs a bounds check.
+
+    Edit walls and ZTL cells through add_wall, remove_wall, add_ztl and
+    remove_ztl: they keep the grid in sync and drop everything derived
+    from the map, such as the neighbour tables. Objects that keep their
+    own state about the map (an incremental planner) can subscribe to be
+    told which cell changed.
+    """
+
     def __init__(self, x_lim: int, y_lim: int, walls: set, ztl: set):
         self.x_lim = x_lim
         self.y_lim = y_lim
-        self.walls = walls
-        self.ztl = ztl
+        self._walls = walls
+        self._ztl = ztl
+        self.stride = y_lim + 3
+        self._cells = None
+        self._flat = None
+        self._derived = {}
+        self._maintained = {}
+        self._listeners = []
+        self.version = 0
+
+    @classmethod
+    def from_cells(cls, cells):
+        """A World over an existing occupancy grid, e.g. a memory-mapped one.
+
+        The walls and ztl sets are only built if something asks for them.
+        """
+        world = cls(cells.shape[0] - 3, cells.shape[1] - 3, None, None)
+        world._cells = cells
+        world._flat = memoryview(cells.reshape(-1))
+        return world
+
+    def __getstate__(self):
+        # Only the map itself is pickled (e.g. to send it to worker
+        # processes): the grid and the derived tables are rebuilt on use
+        state = self.__dict__.copy()
+        state.update(_walls=self.walls, _ztl=self.ztl, _cells=None, _flat=None,
+                     _derived={}, _maintained={}, _listeners=[])
+        return state
+
+    @property
+    def walls(self):
+        if self._walls is None:
+            self._walls = self._cells_with(WALL)
+        return self._walls
+
+    @property
+    def ztl(self):
+        if self._ztl is None:
+            self._ztl = self._cells_with(ZTL)
+        return self._ztl
+
+    def _cells_with(self, flag):
+        xs, ys = np.nonzero(self._cells[1:-1, 1:-1] & flag)
+        return set(zip(xs.tolist(), ys.tolist()))
+
+    @property
+    def cells(self):
+        if self._cells is None:
+            self._cells = self._build_cells()
+            self._flat = memoryview(self._cells.reshape(-1))
+        return self._cells
+
+    @property
+    def flat(self):
+        """The occupancy grid as a flat memoryview, indexed by index()"""
+        if self._flat is None:
+            self.cells
+        return self._flat
+
+    def _build_cells(self):
+        cells = np.full((self.x_lim + 3, self.y_lim + 3), WALL, dtype=np.uint8)
+        cells[1:-1, 1:-1] = FREE
+        for cells_set, flag in ((self.walls, WALL), (self.ztl, ZTL)):
+            if cells_set:
+                xs, ys = self._coordinates(cells_set)
+                cells[xs + 1, ys + 1] |= flag
+        return cells
+
+    def _coordinates(self, cells_set):
+        coords = np.array(list(cells_set), dtype=np.intp).reshape(-1, 2)
+        inside = (coords[:, 0] >= 0) & (coords[:, 0] <= self.x_lim) & \
+            (coords[:, 1] >= 0) & (coords[:, 1] <= self.y_lim)
+        coords = coords[inside]
+        return coords[:, 0], coords[:, 1]
+
+    def add_wall(self, state):
+        self._edit(self.walls, state, WALL, True)
+
+    def remove_wall(self, state):
+        self._edit(self.walls, state, WALL, False)
+
+    def add_ztl(self, state):
+        self._edit(self.ztl, state, ZTL, True)
+
+    def remove_ztl(self, state):
+        self._edit(self.ztl, state, ZTL, False)
+
+    def _edit(self, cells_set, state, flag, add):
+        if (state in cells_set) == add:
+            return
+        if add:
+            cells_set.add(state)
+        else:
+            cells_set.discard(state)
+        if self._cells is not None and 0 <= state[0] <= self.x_lim and 0 <= state[1] <= self.y_lim:
+            if add:
+                self._cells[state[0] + 1, state[1] + 1] |= flag
+            else:
+                self._cells[state[0] + 1, state[1] + 1] &= ~flag & 0xFF
+        self.version += 1
+        self._derived.clear()
+        for ref in list(self._listeners):
+            listener = ref()
+            if listener is None:
+                self._listeners.remove(ref)
+            else:
+                listener(state)
+
+    def subscribe(self, listener):
+        """Call listener(state) after every edit of a wall or ZTL cell.
+
+        A bound method is only weakly referenced: subscribing does not keep
+        its object alive, which stops listening once nothing else uses it.
+        """
+        if hasattr(listener, "__self__"):
+            self._listeners.append(weakref.WeakMethod(listener))
+        else:
+            self._listeners.append(lambda: listener)
+
+    def unsubscribe(self, listener):
+        for ref in self._listeners:
+            if ref() == listener:
+                self._listeners.remove(ref)
+                return
+
+    def derived(self, key, build):
+        """Data computed from the map by build(), cached until the next edit"""
+        try:
+            return self._derived[key]
+        except KeyError:
+            value = self._derived[key] = build()
+            return value
+
+    def content_hash(self):
+        """Hex digest of the limits, walls and ZTL cells of the map.
+
+        Two worlds with the same content share the hash, whatever their
+        history of edits, so it can key results computed on the map.
+        """
+        def build():
+            digest = hashlib.sha1("{}x{}:".format(self.x_lim, self.y_lim).encode())
+            digest.update(self.cells.tobytes())
+            return digest.hexdigest()
+        return self.derived("content_hash", build)
+
+    def maintained(self, key, build):
+        """Like derived, for data that keeps itself up to date.
+
+        The value is kept across edits: build() is expected to subscribe
+        it to them, so it can repair just the part an edit touches.
+        """
+        try:
+            return self._maintained[key]
+        except KeyError:
+            value = self._maintained[key] = build()
+            return value
+
+    def neighbour_table(self, vehicle_type, actions, offsets):
+        blocked = self.blocked(vehicle_type)
+        return self.derived(
+            ("neighbours", blocked, tuple(actions)),
+            lambda: NeighbourTable(self, blocked, actions, offsets))
+
+    def index(self, state):
+        return (state[0] + 1) * self.stride + state[1] + 1
+
+    def state(self, index):
+        return index // self.stride - 1, index % self.stride - 1
+
+    def blocked(self, vehicle_type):
+        """Flags of the cells the vehicle cannot enter"""
+        if vehicle_type == "diesel":
+            return WALL | ZTL
+        return WALL
+
+    def is_free(self, state, vehicle_type="electric"):
+        if not (0 <= state[0] <= self.x_lim and 0 <= state[1] <= self.y_lim):
+            return False
+        return not self.flat[self.index(state)] & self.blocked(vehicle_type)
 
     def __str__(self):
         ret = ""
@@ -15,3 +218,23 @@ class World(object):
                     ret += " "
             ret += "\n"
         return ret
+
+
+def load_map(filename):
+    """Read a map saved by the GUI without touching pygame.
+
+    Returns the World together with the start and end cells. Binary maps
+    (map_format.EXTENSION) are memory-mapped instead of parsed.
+    """
+    import map_format
+    if filename.endswith(map_format.EXTENSION):
+        world, start, end, _ = map_format.load(filename)
+        return world, start, end
+    with open(filename) as f:
+        data = json.load(f)
+    rows = data['rows']
+    walls = {(ele[0], ele[1]) for ele in data['barrier']}
+    ztl = {(ele[0], ele[1]) for ele in data.get('ztl', [])}
+    start = (data['start'][0], data['start'][1])
+    end = (data['end'][0], data['end'][1])
+    return World(rows - 1, rows - 1, walls, ztl), start, end